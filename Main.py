@@ -1,14 +1,21 @@
 import os
 import io
+import json
+import uuid
 import pandas as pd
 from zipfile import ZipFile
 from MyModels import Model
+from MyMatchers import MatchCache
+from MyParsers import ParserProfile
+from MyStores import ColumnFormat, Journal, Database, SQLiteStore
 from MyTabs import BudgetTab, RulesTab, ImportsTab, LedgerTab, DuplicatesTab
-from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QTabWidget, QAction
+from MyWorkers import Worker
+from PyQt5.QtCore import QThreadPool
+from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QTabWidget, QAction, QProgressBar
 
 
 class MainWindow(QMainWindow):
-    file_type = "Zip files (*.zip)"
+    file_type = "Zip files (*.zip);;SQLite files (*.db)"
 
     def __init__(self):
         super().__init__()
@@ -17,6 +24,8 @@ class MainWindow(QMainWindow):
         self.directory = None
         self.file_name = None
         self.model = Model()
+        self.pool = QThreadPool.globalInstance()
+        self.worker = None
         # Main Window
         self.set_title()
         self.setFixedWidth(1600)
@@ -42,6 +51,10 @@ class MainWindow(QMainWindow):
         # Add Tab Widget
         self.tabs = MyTabWidget(self.model)
         self.setCentralWidget(self.tabs)
+        # Progress Bar (Shown While Saving or Loading)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
         # Show
         self.show()
 
@@ -51,32 +64,162 @@ class MainWindow(QMainWindow):
     def load(self):
         self.file_dialog("load")
         self.set_title()
-        with ZipFile(self.file_name, 'r') as zip_file:
-            self.model.budget.df = self.load_dataframe(zip_file, "Budget")
-            self.model.rules.df = self.load_dataframe(zip_file, "Rules")
-            self.model.ledger.df = self.load_dataframe(zip_file, "Ledger")
-        # Update
-        self.tabs.update_tabs()
-
-    def save(self):
+        if self.file_name.endswith(".db"):
+            self.run_worker(self.read_database, self.file_name, finished=self.apply_database)
+        else:
+            self.run_worker(self.read_zip, self.file_name, finished=self.apply_zip)
+
+    def apply_zip(self, data):
+        manifest = data["manifest"]
+        self.model.budget.df = data["Budget"]
+        self.model.rules.df = data["Rules"]
+        if data["Ledger"] is None:
+            self.model.ledger.load_partitions(data["file_name"], manifest["tables"]["Ledger"])
+        else:  # Older Files
+            self.model.ledger.df = data["Ledger"]
+            self.model.ledger.df["ID"] = self.model.ledger.to_IDs(self.model.ledger.df.ID)
+        self.model.profiles = data["profiles"]
+        # Replay Saves Made Since the Snapshot
+        for entry in data["entries"]:
+            self.model.budget.df = entry["Budget"]
+            self.model.rules.df = entry["Rules"]
+            self.model.ledger.replay(entry["ledger"])
+            self.model.profiles = self.get_profiles(entry["profiles"])
+        self.model.cache = self.get_cache(data["cache"], self.model.rules)
+        size = sum(entry["size"] for entry in data["entries"])
+        snapshot = None if manifest is None else manifest.get("snapshot")
+        self.model.journal.reset(data["file_name"], len(data["entries"]), size, snapshot)
+        if manifest is None:  # Rewrite Older Files as a Snapshot
+            self.model.journal.invalidate()
+        # Update (Other Tabs Update When Clicked)
+        self.tabs.update_current_tab()
+
+    def apply_database(self, data):
+        database = data["database"]
+        self.model.budget.df = data["Budget"]
+        self.model.rules.df = data["Rules"]
+        for name, table in [("Imports", self.model.imports), ("Duplicates", self.model.duplicates)]:
+            if data[name] is not None:
+                table.df = data[name]
+        self.model.ledger.load_database(database)
+        self.model.cache = self.get_cache(data["cache"], self.model.rules)
+        if data["profiles"] is not None:
+            self.model.profiles = self.get_profiles(json.loads(data["profiles"]))
+        self.model.database = database
+        self.tabs.update_current_tab()
+
+    def save(self, finished=None):
         if self.name is None:
             self.file_dialog("save")
         self.set_title()
-        with ZipFile(self.file_name, 'w') as zip_file:
-            self.save_dataframe(zip_file, self.model.budget, "Budget")
-            self.save_dataframe(zip_file, self.model.rules, "Rules")
-            self.save_dataframe(zip_file, self.model.ledger, "Ledger")
+        # Copy What is Saved Here, Write it on a Worker Thread
+        file_name = self.file_name
+        journal = self.model.journal
+        if file_name.endswith(".db"):
+            reader = self.model.database  # The GUI's Connection, if it is to the Same File
+            if reader is not None and reader.file_name != file_name:
+                reader = None
+            data = self.snapshot_database(reader)
+            def done(database):
+                if reader is None:
+                    self.model.database = database
+                else:
+                    reader.saving = False
+                    database.close()
+            def undo():
+                data["database"].close()
+                if reader is not None:
+                    reader.saving = False
+            self.run_worker(self.write_database, data, finished=done, failed=undo, after=finished)
+        elif journal.can_append(file_name):
+            data = self.snapshot_journal()
+            def done(result):
+                journal.appended(file_name, data["pending"])
+            self.run_worker(self.append_zip, file_name, data, finished=done,
+                            failed=journal.invalidate, after=finished)
+        else:
+            data = self.snapshot_zip()
+            def done(snapshot):
+                journal.file_name = file_name
+                journal.snapshot = snapshot
+            self.run_worker(self.write_zip, file_name, data, finished=done,
+                            failed=journal.invalidate, after=finished)
+
+    def snapshot_zip(self):
+        self.model.journal.reset()  # Later Edits are Journaled Against this Snapshot
+        data = self.snapshot_tables()
+        data["Ledger"] = self.model.ledger.df.copy()
+        data["cache"] = self.model.cache.to_json(self.model.rules.df.Keyword)
+        return data
+
+    def snapshot_journal(self):
+        data = self.snapshot_tables()
+        data["count"] = self.model.journal.count
+        data["snapshot"] = self.model.journal.snapshot
+        data["entries"], data["pending"] = self.model.journal.take()
+        return data
+
+    def snapshot_database(self, reader):
+        if reader is not None:
+            reader.commit()  # Lazy Renames Made Since the Last Save
+            reader.saving = True  # Refuse More Until the Worker is Done
+        data = self.snapshot_tables()
+        data["database"] = Database(self.file_name)  # The Worker's Own Connection
+        data["Imports"] = self.model.imports.df.copy()
+        data["Duplicates"] = self.model.duplicates.df.copy()
+        ledger = self.model.ledger
+        lazy = ledger.is_lazy() and isinstance(ledger.store, SQLiteStore)
+        if lazy and ledger.store.database is reader:  # Already Up to Date
+            data["Ledger"] = None
+        else:
+            data["Ledger"] = ledger.df.copy()
+        data["cache"] = self.model.cache.to_json(self.model.rules.df.Keyword)
+        return data
+
+    def snapshot_tables(self):
+        return {"Budget": self.model.budget.df.copy(), "Rules": self.model.rules.df.copy(),
+                "profiles": [profile.to_dict() for profile in self.model.profiles.values()]}
 
     def save_as(self):
         self.name = None
         self.save()
 
     def save_and_quit(self):
-        self.save()
-        self.close()
+        self.save(finished=self.close)
+
+    def run_worker(self, function, *args, finished=None, failed=None, after=None):
+        self.set_busy(True)
+        self.worker = Worker(function, *args)
+        self.worker.signals.progress.connect(self.progress_bar.setValue)
+        self.worker.signals.finished.connect(lambda result: self.worker_finished(result, finished, after))
+        self.worker.signals.failed.connect(lambda error: self.worker_failed(error, failed))
+        self.pool.start(self.worker)
+
+    def worker_finished(self, result, finished, after):
+        self.set_busy(False)
+        if finished is not None:
+            finished(result)
+        if after is not None:
+            after()
+
+    def worker_failed(self, error, failed):
+        self.set_busy(False)
+        print(f"Could not access {self.file_name}: {error}")
+        if failed is not None:
+            failed()
+
+    def set_busy(self, busy):
+        for action in [self.load_action, self.save_action, self.save_as_action, self.save_quit_action]:
+            action.setEnabled(not busy)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(busy)
+
+    def closeEvent(self, event):
+        self.pool.waitForDone()  # Let a Running Save Finish
+        super().closeEvent(event)
 
     def file_dialog(self, mode):
-        file_type = "Zip files (*.zip)"
+        file_type = "Zip files (*.zip);;SQLite files (*.db)"
         directory = os.path.dirname(__file__)
         if mode == "load":
             file_name = QFileDialog.getOpenFileName(self, "Select File to Open", directory, file_type)[0]
@@ -86,16 +229,143 @@ class MainWindow(QMainWindow):
         self.name = file_name.split('/')[-1].split('.')[0]
         self.directory = '/'.join(file_name.split('/')[:-1])
 
+    @classmethod
+    def read_zip(cls, file_name, progress):
+        data = {"file_name": file_name}
+        with ZipFile(file_name, 'r') as zip_file:
+            manifest = ColumnFormat.load_manifest(zip_file)
+            data["manifest"] = manifest
+            data["Budget"] = cls.load_dataframe(zip_file, manifest, "Budget")
+            data["Rules"] = cls.load_dataframe(zip_file, manifest, "Rules")
+            progress(20)
+            if manifest is not None and "partitions" in manifest["tables"]["Ledger"]:
+                data["Ledger"] = None  # Read on Demand
+            else:
+                data["Ledger"] = cls.load_dataframe(zip_file, manifest, "Ledger")
+            progress(70)
+            snapshot = None if manifest is None else manifest.get("snapshot")
+            data["entries"] = cls.read_entries(zip_file, snapshot)  # Older Saves Kept Them Inside
+            for record in Journal.read_records(file_name):
+                with ZipFile(io.BytesIO(record), 'r') as record_zip:
+                    data["entries"] += cls.read_entries(record_zip, snapshot)
+            data["profiles"] = cls.load_profiles(zip_file)
+            data["cache"] = cls.load_text(zip_file, "Cache.json")
+        progress(100)
+        return data
+
     @staticmethod
-    def load_dataframe(zip_file, name):
-        data = zip_file.read(f"{name}.csv").decode()
+    def read_entries(zip_file, snapshot):
+        entries = []
+        for entry in Journal.load_entries(zip_file):
+            if entry.get("snapshot") == snapshot:  # Left Over from an Earlier Snapshot Otherwise
+                entry["Budget"] = ColumnFormat.load_table(zip_file, entry["tables"]["Budget"])
+                entry["Rules"] = ColumnFormat.load_table(zip_file, entry["tables"]["Rules"])
+                entries.append(entry)
+        return entries
+
+    @staticmethod
+    def write_zip(file_name, data, progress):
+        temp_name = f"{file_name}.tmp"  # Replaced Atomically When Complete
+        snapshot = uuid.uuid4().hex
+        try:
+            with ZipFile(temp_name, 'w') as zip_file:
+                tables = dict()
+                tables["Budget"] = ColumnFormat.save_table(zip_file, data["Budget"], "Budget")
+                tables["Rules"] = ColumnFormat.save_table(zip_file, data["Rules"], "Rules")
+                progress(10)
+                tables["Ledger"] = ColumnFormat.save_partitions(zip_file, data["Ledger"], "Ledger",
+                                                                progress=lambda n, N: progress(10 + 80 * n // N))
+                ColumnFormat.save_manifest(zip_file, tables, snapshot)
+                zip_file.writestr("Cache.json", data["cache"])
+                zip_file.writestr("Profiles.json", json.dumps(data["profiles"]))
+            os.replace(temp_name, file_name)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+        Journal.remove(file_name)  # Entries Against the Old Snapshot
+        progress(100)
+        return snapshot
+
+    @staticmethod
+    def append_zip(file_name, data, progress):
+        # Small Tables are Saved Whole, the Ledger as its Changes (the Snapshot is Not Touched)
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w') as zip_file:
+            prefix = Journal.prefix(data["count"])
+            tables = dict()
+            tables["Budget"] = ColumnFormat.save_table(zip_file, data["Budget"], f"{prefix}/Budget")
+            tables["Rules"] = ColumnFormat.save_table(zip_file, data["Rules"], f"{prefix}/Rules")
+            Journal.save_entry(zip_file, data["count"], data["snapshot"], tables, data["profiles"],
+                               data["entries"], data["pending"])
+        progress(50)
+        Journal.append_record(file_name, buffer.getvalue())
+        progress(100)
+
+    @staticmethod
+    def read_database(file_name, progress):
+        database = Database(file_name)
+        data = {"database": database}
+        data["Budget"] = database.load_table("Budget")
+        data["Rules"] = database.load_table("Rules")
+        progress(50)
+        for name in ["Imports", "Duplicates"]:
+            data[name] = database.load_table(name) if database.has_table(name) else None
+        data["cache"] = database.load_setting("Cache")
+        data["profiles"] = database.load_setting("Profiles")
+        progress(100)
+        return data
+
+    @staticmethod
+    def write_database(data, progress):
+        # One Transaction, so a Failed Save Leaves the Last One in Place
+        database = data["database"]
+        names = ["Budget", "Rules", "Imports", "Duplicates", "Ledger"]
+        try:
+            for n, name in enumerate(names):
+                if data[name] is not None:
+                    database.save_table(name, data[name])
+                progress(90 * (n + 1) // len(names))
+            database.save_setting("Cache", data["cache"])
+            database.save_setting("Profiles", json.dumps(data["profiles"]))
+            database.commit()
+        except Exception:
+            database.rollback()
+            raise
+        progress(100)
+        return database
+
+    @staticmethod
+    def load_dataframe(zip_file, manifest, name):
+        if manifest is not None:
+            return ColumnFormat.load_table(zip_file, manifest["tables"][name])
+        data = zip_file.read(f"{name}.csv").decode()  # Older Files
         data = io.StringIO(data)
-        data = pd.read_csv(data, sep=",")
+        data = pd.read_csv(data, sep=",", index_col=0)
         return data
 
     @staticmethod
-    def save_dataframe(zip_file, data, name):
-        zip_file.writestr(f"{name}.csv", data.df.to_csv())
+    def load_text(zip_file, name):
+        if name not in zip_file.namelist():  # Older Files
+            return None
+        return zip_file.read(name).decode()
+
+    @classmethod
+    def load_profiles(cls, zip_file):
+        data = cls.load_text(zip_file, "Profiles.json")
+        if data is None:
+            return dict()
+        return cls.get_profiles(json.loads(data))
+
+    @staticmethod
+    def get_profiles(data):
+        profiles = [ParserProfile.from_dict(item) for item in data]
+        return {profile.header: profile for profile in profiles}
+
+    @staticmethod
+    def get_cache(data, rules):
+        if data is None:
+            return MatchCache()
+        return MatchCache.from_json(data, rules.df.Keyword)
 
 
 class MyTabWidget(QTabWidget):
@@ -112,6 +382,9 @@ class MyTabWidget(QTabWidget):
 
     def update_clicked_tab(self, index):
         self.tabs[index].update_tab()
+
+    def update_current_tab(self):
+        self.tabs[self.currentIndex()].update_tab()
         
     def update_tabs(self):
         for tab in self.tabs:
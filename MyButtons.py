@@ -1,4 +1,7 @@
-from PyQt5.QtWidgets import QPushButton, QComboBox
+import os
+from PyQt5.QtCore import Qt, QEvent
+from PyQt5.QtWidgets import (QPushButton, QComboBox, QCheckBox, QApplication, QStyle,
+                             QStyledItemDelegate, QStyleOptionButton)
 
 
 class YearComboBox(QComboBox):
@@ -21,7 +24,7 @@ class YearComboBox(QComboBox):
                 self.removeItem(i)
         
     def get_years(self):
-        return self.widget.model.ledger.df.Year.unique()
+        return self.widget.model.ledger.get_years()
     
     def get_values(self):
         return (["All"] + self.years.astype(str).tolist())
@@ -55,6 +58,14 @@ class ImportTransactionsButton(PushButton):
         self.widget.import_transactions()
 
 
+class ImportFilesButton(PushButton):
+    def __init__(self, widget):
+        super().__init__(widget, "Import Multiple Files")
+
+    def clicked_function(self):
+        self.widget.import_files()
+
+
 class AutoCategorizeButton(PushButton):
     def __init__(self, widget):
         super().__init__(widget, "Auto Categorize Transactions")
@@ -63,6 +74,18 @@ class AutoCategorizeButton(PushButton):
         self.widget.auto_categorize()
         
         
+class ParallelCheckBox(QCheckBox):
+    def __init__(self, widget):
+        super().__init__("Categorize on All Cores")
+        self.widget = widget
+        self.setChecked(widget.model.processes > 1)
+        self.stateChanged.connect(self.changed_function)
+
+    def changed_function(self, state):
+        # Only Used When Many New Memos Miss the Match Cache
+        self.widget.model.processes = (os.cpu_count() or 1) if self.isChecked() else 1
+
+
 class AcceptCategorizedButton(PushButton):
     def __init__(self, widget):
         super().__init__(widget, "Accept Categorized Transactions")
@@ -87,6 +110,14 @@ class ClearDuplicatesButton(PushButton):
         self.widget.clear_duplicates()
 
 
+class NearDuplicatesButton(PushButton):
+    def __init__(self, widget):
+        super().__init__(widget, "Find Near Duplicates")
+
+    def clicked_function(self):
+        self.widget.find_near_duplicates()
+
+
 class SwapRows(PushButton):
     def __init__(self, widget, name):
         super().__init__(widget, name)
@@ -131,7 +162,45 @@ class PrintButton(PushButton):
         print(self.widget.data.df)
         
 
-class AddRuleButton(PushButton):
+class ButtonDelegate(QStyledItemDelegate):
+    # Paints a Button in Each Visible Cell of a Column, No Widget per Row
+    def __init__(self, widget, name):
+        super().__init__(widget)
+        self.widget = widget
+        self.name = name
+        self.pressed = None
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(1, 1, -1, -1)
+        button.text = self.name
+        if self.pressed == (index.row(), index.column()):
+            button.state = QStyle.State_Enabled | QStyle.State_Sunken
+        else:
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        cell = (index.row(), index.column())
+        if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+            self.pressed = cell
+            self.widget.update(index)
+            return True
+        if event.type() == QEvent.MouseButtonRelease and self.pressed is not None:
+            pressed, self.pressed = self.pressed, None
+            self.widget.update(index)
+            if pressed == cell and option.rect.contains(event.pos()):
+                self.widget.setCurrentIndex(index)
+                self.clicked_function()
+            return True
+        return False
+
+    def clicked_function(self):
+        pass
+
+
+class AddRuleButton(ButtonDelegate):
     def __init__(self, widget):
         super().__init__(widget, "Add Rule")
         
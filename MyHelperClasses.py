@@ -1,3 +1,4 @@
+import itertools
 import numpy as np
 
 
@@ -6,6 +7,36 @@ class Colors:
               "purple", "pink", "yellow", "magenta", "grey")
 
 
+class ChangeSet:
+    max_blocks = 256  # Past This a Full Refresh is Cheaper
+    versions = itertools.count()  # Shared so a New Frame Never Reuses a Version
+
+    def __init__(self):
+        self.reset = True  # Whole Table (New Frame or Rows Added/Removed)
+        self.blocks = []  # (Row Labels, Column Names) Written Since the Last Refresh
+        self.version = next(self.versions)
+
+    def add(self, rows, columns):
+        self.version = next(self.versions)
+        if self.reset:
+            return
+        if len(self.blocks) >= self.max_blocks:
+            self.add_all()
+        else:
+            self.blocks.append((rows, columns))
+
+    def add_all(self):
+        self.version = next(self.versions)
+        self.reset = True
+        self.blocks = []
+
+    def pop(self):
+        reset, blocks = self.reset, self.blocks
+        self.reset = False
+        self.blocks = []
+        return reset, blocks
+
+
 class Date:
     month_data = {"Jan": 31, "Feb": 28, "Mar": 31, "Apr": 30, "May": 31, "Jun": 30,
                   "Jul": 31, "Aug": 31, "Sep": 30, "Oct": 31, "Nov": 30, "Dec": 31}
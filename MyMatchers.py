@@ -0,0 +1,408 @@
+import re
+import json
+import hashlib
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+class KeywordMatcher:
+    special = set(".^$*+?{}[]\\|()")
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.literals = []
+        self.patterns = []
+        for rule, keyword in enumerate(self.keywords):
+            texts = self.get_literals(keyword)
+            if texts is None:
+                if self.is_pattern(keyword):  # A bad pattern can't block the other rules
+                    self.patterns.append((rule, re.compile(keyword, re.I)))
+            else:
+                self.literals += [(rule, text) for text in texts]
+        self.folded = None
+        self.build_automaton()
+        self.build_exact()
+
+    @staticmethod
+    def is_pattern(keyword):
+        try:
+            re.compile(keyword, re.I)
+        except re.error:
+            return False
+        return True
+
+    @classmethod
+    def get_literals(cls, keyword):
+        # Plain text, escaped punctuation and top level "|" branches are literals
+        # (re.I on ASCII text is the same as comparing lower-cased text)
+        if not keyword.isascii():
+            return None
+        texts = []
+        text = ""
+        escaped = False
+        for char in keyword:
+            if escaped:
+                if char.isalnum():  # Character Classes like \d or \b
+                    return None
+                text += char
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == "|":
+                texts.append(text)
+                text = ""
+            elif char in cls.special:
+                return None
+            else:
+                text += char
+        if escaped:
+            return None
+        texts.append(text)
+        return [text.lower() for text in texts]
+
+    def build_automaton(self):
+        # Aho-Corasick Trie
+        self.goto = [dict()]
+        self.output = [[]]
+        self.empty = []
+        for rule, text in self.literals:
+            if not text:  # Empty Keyword Matches Everything
+                self.empty.append(rule)
+                continue
+            node = 0
+            for char in text:
+                if char not in self.goto[node]:
+                    self.goto.append(dict())
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append(rule)
+        # Failure Links (Breadth First)
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                if node:
+                    self.fail[child] = self.goto[state].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue.append(child)
+
+    def build_exact(self):
+        # Memos that are exactly a merchant name resolve with one hash lookup
+        self.exact = dict()
+        for rule, text in self.literals:
+            if text and text not in self.exact:
+                self.exact[text] = self.scan(text)
+
+    def scan(self, memo):
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set(self.empty)
+        node = 0
+        for char in memo.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+    def search_literals(self, memo):
+        # Non-ASCII memos fall back to regex so case folding matches re.I exactly
+        if self.folded is None:
+            self.folded = [(rule, re.compile(re.escape(text), re.I)) for rule, text in self.literals]
+        found = set()
+        for rule, pattern in self.folded:
+            if pattern.search(memo):
+                found.add(rule)
+        return found
+
+    def match(self, memos):
+        rule_indexes = []
+        memo_indexes = []
+        # Literal Keywords (Exact Merchant Lookup then Single Pass per Memo)
+        for n, memo in enumerate(memos):
+            if not isinstance(memo, str):
+                continue
+            if memo.isascii():
+                rules = self.exact.get(memo.lower())
+                if rules is None:
+                    rules = self.scan(memo)
+            else:
+                rules = self.search_literals(memo)
+            rule_indexes += rules
+            memo_indexes += [n] * len(rules)
+        # Pattern Keywords
+        for rule, pattern in self.patterns:
+            index = [n for n, memo in enumerate(memos)
+                     if isinstance(memo, str) and pattern.search(memo)]
+            rule_indexes += [rule] * len(index)
+            memo_indexes += index
+        # Sort by Rule then Memo
+        rule_indexes = np.array(rule_indexes, dtype=int)
+        memo_indexes = np.array(memo_indexes, dtype=int)
+        order = np.lexsort((memo_indexes, rule_indexes))
+        return rule_indexes[order], memo_indexes[order]
+
+
+class ParallelMatcher:
+    chunks_per_process = 4
+    matcher = None
+    memory = None
+
+    def __init__(self, keywords, processes):
+        self.keywords = list(keywords)
+        self.processes = processes
+
+    @staticmethod
+    def pack(memos):
+        # Layout: offsets (int64, N+1) | valid flags (uint8, N) | utf-8 text
+        data = [memo.encode() if isinstance(memo, str) else b"" for memo in memos]
+        offsets = np.zeros(len(data) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(item) for item in data])
+        valid = np.array([isinstance(memo, str) for memo in memos], dtype=np.uint8)
+        header = offsets.tobytes() + valid.tobytes()
+        memory = shared_memory.SharedMemory(create=True, size=max(1, len(header) + int(offsets[-1])))
+        memory.buf[:len(header)] = header
+        memory.buf[len(header):len(header) + int(offsets[-1])] = b"".join(data)
+        return memory
+
+    @classmethod
+    def initialize(cls, keywords, name):
+        # Runs once per worker: rules are compiled once, memos are read in place
+        try:
+            cls.memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            cls.memory = shared_memory.SharedMemory(name=name)
+        cls.matcher = KeywordMatcher(keywords)
+
+    @classmethod
+    def match_chunk(cls, size, start, stop):
+        buffer = cls.memory.buf
+        offsets = np.frombuffer(buffer, dtype=np.int64, count=size + 1)
+        valid = np.frombuffer(buffer, dtype=np.uint8, count=size, offset=8 * (size + 1))
+        base = 9 * size + 8
+        memos = []
+        for n in range(start, stop):
+            if valid[n]:
+                memos.append(bytes(buffer[base + offsets[n]:base + offsets[n + 1]]).decode())
+            else:
+                memos.append(None)
+        del offsets, valid  # Release Views of Shared Buffer
+        rule_indexes, memo_indexes = cls.matcher.match(memos)
+        return rule_indexes, memo_indexes + start
+
+    def match(self, memos):
+        size = len(memos)
+        memory = self.pack(memos)
+        try:
+            bounds = np.linspace(0, size, self.processes * self.chunks_per_process + 1).astype(int)
+            with ProcessPoolExecutor(self.processes, initializer=self.initialize,
+                                     initargs=(self.keywords, memory.name)) as pool:
+                results = list(pool.map(self.match_chunk, [size] * (len(bounds) - 1),
+                                        bounds[:-1], bounds[1:]))
+        finally:
+            memory.close()
+            memory.unlink()
+        # Merge in Serial Order
+        rule_indexes = np.concatenate([result[0] for result in results] + [[]]).astype(int)
+        memo_indexes = np.concatenate([result[1] for result in results] + [[]]).astype(int)
+        order = np.lexsort((memo_indexes, rule_indexes))
+        return rule_indexes[order], memo_indexes[order]
+
+
+class MemoIndex:
+    size = 3
+
+    def __init__(self):
+        self.rows = dict()
+        self.grams = dict()
+        self.others = set()
+
+    def get_grams(self, text):
+        return {text[i:i + self.size] for i in range(len(text) - self.size + 1)}
+
+    def add(self, memo, row):
+        if memo not in self.rows:
+            self.rows[memo] = set()
+            if isinstance(memo, str) and memo.isascii():
+                for gram in self.get_grams(memo.lower()):
+                    self.grams.setdefault(gram, set()).add(memo)
+            else:
+                self.others.add(memo)
+        self.rows[memo].add(row)
+
+    def remove(self, memo, row):
+        rows = self.rows.get(memo)
+        if rows is None:
+            return
+        rows.discard(row)
+        if not rows:
+            del self.rows[memo]
+            if memo in self.others:
+                self.others.discard(memo)
+            else:
+                for gram in self.get_grams(memo.lower()):
+                    memos = self.grams[gram]
+                    memos.discard(memo)
+                    if not memos:
+                        del self.grams[gram]
+
+    def candidates(self, keyword):
+        # Literal keywords can only be in memos sharing all of their trigrams
+        texts = KeywordMatcher.get_literals(keyword)
+        if texts is None or min(map(len, texts)) < self.size:
+            return set(self.rows)
+        memos = set(self.others)
+        for text in texts:
+            postings = [self.grams.get(gram, set()) for gram in self.get_grams(text)]
+            postings.sort(key=len)
+            memos.update(postings[0].intersection(*postings[1:]))
+        return memos
+
+    def get_rows(self, memos):
+        rows = set()
+        for memo in memos:
+            rows.update(self.rows.get(memo, ()))
+        return sorted(rows)
+
+
+class MatchCache:
+    parallel_size = 50000
+
+    def __init__(self, keywords=(), entries=None):
+        self.known = set(keywords)
+        self.added = []
+        self.entries = dict()
+        for memo, matched in (entries or dict()).items():
+            self.entries[memo] = (0, frozenset(matched))
+
+    @staticmethod
+    def fingerprint(keywords):
+        text = "\n".join(sorted(keywords))
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def sync(self, keywords):
+        # New keywords are checked lazily against cached memos
+        self.known.intersection_update(keywords)
+        for keyword in keywords:
+            if keyword not in self.known:
+                self.known.add(keyword)
+                if self.entries and KeywordMatcher.is_pattern(keyword):
+                    self.added.append(keyword)
+
+    def get(self, memo):
+        entry = self.entries.get(memo)
+        if entry is None:
+            return None
+        seen, matched = entry
+        if seen < len(self.added):
+            found = {keyword for keyword in self.added[seen:] if re.search(keyword, memo, re.I)}
+            matched = matched | found
+            self.entries[memo] = (len(self.added), matched)
+        return matched
+
+    def match(self, memos, rules, processes=1):
+        keywords = rules.df.Keyword.tolist()
+        self.sync(keywords)
+        rule_indexes = []
+        memo_indexes = []
+        misses = []
+        # Cached Memos
+        for n, memo in enumerate(memos):
+            matched = self.get(memo)
+            if matched is None:
+                misses.append(n)
+                continue
+            for keyword in matched:
+                rows = rules.get_rows(keyword)  # Deleted Keywords Have No Rows
+                rule_indexes += rows
+                memo_indexes += [n] * len(rows)
+        # New Memos
+        if misses:
+            misses = np.array(misses, dtype=int)
+            if processes > 1 and len(misses) >= self.parallel_size:
+                matcher = ParallelMatcher(keywords, processes)
+            else:
+                matcher = KeywordMatcher(keywords)
+            new_rules, new_memos = matcher.match([memos[n] for n in misses])
+            found = dict()
+            for rule, n in zip(new_rules, misses[new_memos]):
+                found.setdefault(n, set()).add(keywords[rule])
+            for n in misses:
+                if isinstance(memos[n], str):
+                    self.entries[memos[n]] = (len(self.added), frozenset(found.get(n, ())))
+            rule_indexes += new_rules.tolist()
+            memo_indexes += misses[new_memos].tolist()
+        # Sort by Rule then Memo
+        rule_indexes = np.array(rule_indexes, dtype=int)
+        memo_indexes = np.array(memo_indexes, dtype=int)
+        order = np.lexsort((memo_indexes, rule_indexes))
+        return rule_indexes[order], memo_indexes[order]
+
+    def to_json(self, keywords):
+        keywords = list(keywords)
+        current = set(keywords)
+        entries = dict()
+        for memo in self.entries:
+            entries[memo] = sorted(current.intersection(self.get(memo)))
+        data = {"fingerprint": self.fingerprint(keywords),
+                "keywords": sorted(current),
+                "entries": entries}
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, text, keywords):
+        data = json.loads(text)
+        cache = cls(data["keywords"], data["entries"])
+        if data["fingerprint"] != cls.fingerprint(keywords):
+            cache.sync(keywords)
+        return cache
+
+
+class NearDuplicateFinder:
+    def __init__(self, days=1, similarity=0.8):
+        self.days = days
+        self.similarity = similarity
+        self.texts = dict()
+
+    def normalize(self, memo):
+        text = self.texts.get(memo)
+        if text is None:
+            text = "".join(char for char in str(memo).lower() if char.isalnum())
+            self.texts[memo] = text
+        return text
+
+    def is_similar(self, memo1, memo2):
+        text1, text2 = self.normalize(memo1), self.normalize(memo2)
+        if text1 == text2:
+            return True
+        return SequenceMatcher(None, text1, text2).ratio() >= self.similarity
+
+    def find(self, df):
+        # Block by Amount (in Cents) then Sort by Date
+        dates = pd.to_datetime({"year": df.Year, "month": df.Month, "day": df.Day}, errors="coerce")
+        valid = dates.notna().values
+        cents = np.round(df.Amount.values[valid].astype(float) * 100).astype(np.int64)
+        days = dates.values[valid].astype("datetime64[D]").astype(np.int64)
+        rows = df.index.values[valid]
+        memos = df.Memo.values[valid]
+        order = np.lexsort((rows, days, cents))
+        cents, days, rows, memos = cents[order], days[order], rows[order], memos[order]
+        # Compare Each Row with the Next Rows in its Window Only
+        found = set()
+        offset = 1
+        while offset < len(rows):
+            window = (cents[offset:] == cents[:-offset]) & (days[offset:] - days[:-offset] <= self.days)
+            if not window.any():  # Sorted, so no Further Row can be Closer
+                break
+            for n in np.flatnonzero(window):
+                if self.is_similar(memos[n], memos[n + offset]):
+                    found.add(int(max(rows[n], rows[n + offset])))  # Keep the First Row
+            offset += 1
+        return sorted(found)
@@ -1,7 +1,14 @@
+import os
 import re
+import csv
+from collections import Counter
 import numpy as np
 import pandas as pd
-from MyHelperClasses import Date
+from concurrent.futures import ProcessPoolExecutor
+from MyHelperClasses import Date, ChangeSet
+from MyMatchers import KeywordMatcher, MatchCache, MemoIndex, NearDuplicateFinder
+from MyParsers import ParserProfile
+from MyStores import RowStore, LazyStore, PartitionStore, SQLiteStore, Journal, SummaryCube
 
 
 class Model:
@@ -13,6 +20,12 @@ class Model:
         self.duplicates = DuplicateData(self, duplicates)
         self.tables = [self.budget, self.rules, self.imports, self.ledger, self.duplicates]
         self.summary = SummaryTable(self)
+        self.cache = MatchCache()
+        self.profiles = dict()
+        self.journal = Journal()
+        self.ledger.journal = self.journal
+        self.database = None
+        self.processes = 1  # Worker Processes for Large Categorizations (Imports Tab Checkbox)
         
     def summarize(self, start, stop):
         self.budget.df = self.summary.summarize(start, stop)
@@ -27,10 +40,18 @@ class Model:
     def rename_keyword(self, old_keyword, new_keyword):
         for table in self.tables:
             table.rename_keyword(old_keyword, new_keyword)
+
+    def delete_keyword(self, keyword):
+        for table in self.tables:
+            table.delete_keyword(keyword)
             
     def recategorize_keyword(self, keyword, new_category):
         for table in self.tables:
             table.recategorize_keyword(keyword, new_category)
+
+    def categorize_keyword(self, keyword):
+        for table in self.tables:
+            table.categorize_keyword(keyword)
     
     def resubcategorize_keyword(self, keyword, new_subcategory):
         for table in self.tables:
@@ -42,6 +63,19 @@ class DataFrame:
         self.model = model
         self.df = pd.DataFrame(data, columns=self.columns)
         self.name = name
+
+    @property
+    def df(self):
+        return self.store.get()
+
+    @df.setter
+    def df(self, df):
+        self.store = RowStore(df)
+        self.changes = ChangeSet()
+
+    def mark(self, rows, columns):
+        # Record Written Cells for the Views
+        self.changes.add(rows, columns)
         
     def set_nothing(self, row, col, text):
         return text
@@ -49,51 +83,57 @@ class DataFrame:
     def set_value(self, row, col, text):
         function = self.functions[col]
         value = function(row, col, text)
+        self.mark([row], [self.columns[col]])
         return value
     
     def swap_rows(self, row1, row2):
         temp = self.df.iloc[row1, :].copy()
         self.df.iloc[row1, :] = self.df.iloc[row2, :].copy()
         self.df.iloc[row2, :] = temp
+        self.mark([row1, row2], self.columns)
 
     def insert_blank_row(self):
-        N = len(self.df)
-        self.df.loc[N] = dict(zip(self.columns, self.defaults))
+        row = pd.DataFrame([dict(zip(self.columns, self.defaults))], columns=self.columns)
+        self.store.append(row)
+        self.changes.add_all()
         print(f"{self.name} row added (blank).")
 
     def delete_row(self, row):
-        self.df.drop(row, inplace=True)
-        self.df.reset_index(drop=True, inplace=True)
+        self.store.delete(row)
+        self.changes.add_all()
         print(f"{self.name} {row} deleted.")
 
+    def delete_rows(self, rows):
+        self.store.delete_rows(rows)
+        self.changes.add_all()
+        print(f"{self.name} {len(rows)} rows deleted.")
+
     def rename_budget_category(self, old_category, new_category):
         if "Category" in self.columns:
             index = self.df.Category == old_category
             self.df.loc[index, "Category"] = new_category
+            self.mark(self.df.index[index], ["Category"])
             
     def rename_keyword(self, old_keyword, new_keyword):
-        # TODO: Check/Redo this logic
-        if isinstance(self, LedgerData):
-            ledger_indexes = np.where(self.df.Keyword == old_keyword)[0]
-            for ledger_index in ledger_indexes:
-                memo = self.df.loc[ledger_index, "Memo"]
-                result = re.search(new_keyword, memo, re.I)
-                if isinstance(result, re.Match):
-                    self.df.loc[ledger_index, "Keyword"] = new_keyword
-                else:
-                    print(f"{memo} does not contain new keyword {new_keyword}")
-                    rule_index = np.where(self.model.rules.df.Keyword == old_keyword)[0]
-                    self.assign(ledger_index, rule_index, "None", "None", "None")
+        pass
+
+    def delete_keyword(self, keyword):
+        pass
+
+    def categorize_keyword(self, keyword):
+        pass
             
     def recategorize_keyword(self, keyword, new_category):
         if "Keyword" in self.columns:
             index = self.df.Keyword == keyword
             self.df.loc[index, "Category"] = new_category
+            self.mark(self.df.index[index], ["Category"])
     
     def resubcategorize_keyword(self, keyword, new_subcategory):
         if "Keyword" in self.columns:
             index = self.df.Keyword == keyword
             self.df.loc[index, "Sub Category"] = new_subcategory
+            self.mark(self.df.index[index], ["Sub Category"])
 
 
 class BudgetData(DataFrame):
@@ -165,13 +205,62 @@ class RulesData(DataFrame):
         self.functions = (self.set_keyword, self.set_category,
                           self.set_subcategory, self.set_nothing)
         super().__init__(model, data, name)
-        
+
+    @DataFrame.df.setter
+    def df(self, df):
+        DataFrame.df.fset(self, df)
+        self.update_index()
+
+    def update_index(self):
+        self.keyword_index = dict()
+        for row, keyword in enumerate(self.df.Keyword):
+            self.keyword_index.setdefault(keyword, set()).add(row)
+
+    def get_rows(self, keyword):
+        return sorted(self.keyword_index.get(keyword, ()))
+
+    def add_counts(self, rows, delta):
+        self.df.loc[rows, "Count"] += delta
+        self.mark(rows, ["Count"])
+
+    def add_index(self, keyword, row):
+        self.keyword_index.setdefault(keyword, set()).add(row)
+
+    def remove_index(self, keyword, row):
+        rows = self.keyword_index[keyword]
+        rows.discard(row)
+        if not rows:
+            del self.keyword_index[keyword]
+
+    def insert_blank_row(self):
+        super().insert_blank_row()
+        self.add_index(self.defaults[0], len(self.store) - 1)
+
+    def delete_row(self, row):
+        keyword = self.store.get_value(row, 0)
+        super().delete_row(row)
+        self.update_index()
+        if keyword not in self.keyword_index:
+            self.model.delete_keyword(keyword)
+
+    def swap_rows(self, row1, row2):
+        keyword1, keyword2 = self.df.iloc[row1, 0], self.df.iloc[row2, 0]
+        super().swap_rows(row1, row2)
+        self.remove_index(keyword1, row1)
+        self.remove_index(keyword2, row2)
+        self.add_index(keyword1, row2)
+        self.add_index(keyword2, row1)
+
     def set_keyword(self, row, col, new_keyword):
         old_keyword = self.df.iloc[row, col]
-        if new_keyword not in self.df.Keyword.values:
-            self.df.Count[row] = 0
-            self.model.rename_keyword(old_keyword, new_keyword)
+        if not KeywordMatcher.is_pattern(new_keyword):
+            print(f"Rule {new_keyword} is not a valid pattern.")
+            return old_keyword
+        if new_keyword not in self.keyword_index:
             self.df.iloc[row, col] = new_keyword
+            self.remove_index(old_keyword, row)
+            self.add_index(new_keyword, row)
+            self.model.rename_keyword(old_keyword, new_keyword)
             return new_keyword
         else:
             print(f"Rule {new_keyword} already exists.")
@@ -181,8 +270,11 @@ class RulesData(DataFrame):
         value = text.upper()
         if value in self.model.budget.df.Category.values:
             keyword = self.df.loc[row, "Keyword"]
+            active = self.df.iloc[row, col] in self.model.budget.df.Category.values
             self.df.iloc[row, col] = value
             self.model.recategorize_keyword(keyword, value)
+            if not active:  # The Rule Can Assign Rows Now
+                self.model.categorize_keyword(keyword)
             return value
         else:
             print(f"Budget {value} does not exist.")
@@ -206,7 +298,7 @@ class RulesData(DataFrame):
 class TransactionData(DataFrame):
     columns = ("Year", "Month", "Day", "Memo", "Amount",
                "Keyword", "Category", "Sub Category", "ID")
-    defaults = (2020, 1, 1, "", 0, "None", "None", "None", "None")
+    defaults = (2020, 1, 1, "", 0, "None", "None", "None", 0)
     disabled = ("Memo", "Amount")
     
     def __init__(self, model, data=None, name=None):
@@ -214,11 +306,45 @@ class TransactionData(DataFrame):
                           self.set_nothing, self.set_nothing, 
                           self.set_keyword, self.set_category, self.set_subcategory)
         super().__init__(model, data, name)
+        self.df["ID"] = self.to_IDs(self.df.ID)
         
     def empty_data(self):
         data = dict(zip(self.columns, [len(self.columns) * []]))
         return data
 
+    def insert_blank_row(self):
+        # Append a typed row so the 64-bit IDs are not cast to float
+        row = pd.DataFrame([dict(zip(self.columns, self.defaults))], columns=self.columns)
+        row["ID"] = row.ID.astype(np.uint64)
+        self.store.append(row)
+        self.changes.add_all()
+        print(f"{self.name} row added (blank).")
+
+    @staticmethod
+    def get_keys(year, month, day, memo, amount):
+        dl = "|"
+        if isinstance(year, int):
+            memo = memo if isinstance(memo, str) else ""
+            key = dl.join([str(year), str(month), str(day), memo, str(amount)])
+        else:
+            year, month, day, amount = (year.apply(str), month.apply(str),
+                                        day.apply(str), amount.apply(str))
+            key = year + dl + month + dl + day + dl + memo.fillna("") + dl + amount
+        return key
+
+    @staticmethod
+    def hash_keys(keys):
+        # 64-bit IDs (SipHash with pandas' fixed key, so stable across sessions)
+        ids = pd.util.hash_array(np.asarray(keys, dtype=object))
+        return pd.Series(ids, index=keys.index, dtype=np.uint64)
+
+    @classmethod
+    def to_IDs(cls, ids):
+        # Older files store the full text key as the ID
+        if ids.dtype == object or pd.api.types.is_string_dtype(ids):
+            return cls.hash_keys(ids.astype(str))
+        return ids.astype(np.uint64)
+
     def set_year(self, row, col, text):
         try:
             value = int(text)
@@ -259,8 +385,8 @@ class TransactionData(DataFrame):
         if text not in self.df.Keyword.values:
             old_text = self.df.iloc[row, col]
             if old_text != "None":
-                rule_index = np.where(self.model.rules.df.Keyword == old_text)[0]
-                self.model.rules.df.Count[rule_index] -= 1
+                rule_index = self.model.rules.get_rows(old_text)
+                self.model.rules.add_counts(rule_index, -1)
             self.df.iloc[row, col] = text
             return text
         else:
@@ -293,59 +419,381 @@ class LedgerData(TransactionData):
                     "Category": ["None", "None", "None", "None"],
                     "Sub Category": ["None", "None", "None", "None"],
                     "ID": ["1", "2", "3", "4"]}
+        self.journal = None  # Only the Ledger is Journaled
+        self.cube = None  # Built on First Summary, then Kept Up to Date
         super().__init__(model, data, name)
-    
-    def auto_categorize(self):
+
+    @DataFrame.df.setter
+    def df(self, df):
+        DataFrame.df.fset(self, df)
+        self.invalidate_index()
+        self.ids = None
+        self.cube = None
+        if self.journal is not None:
+            self.journal.invalidate()
+
+    def load_partitions(self, file_name, schema):
+        # Rows Stay in the File Until Something Needs Them
+        self.store = PartitionStore(file_name, schema)
+        self.changes.add_all()
+        self.invalidate_index()
+        self.ids = None
+        self.cube = None
+        if self.journal is not None:
+            self.journal.invalidate()
+
+    def load_database(self, database, name="Ledger"):
+        # Queries and Renames Run as SQL Until the Rows are Needed
+        self.store = SQLiteStore(database, name)
+        self.changes.add_all()
+        self.invalidate_index()
+        self.ids = None
+        self.cube = None
+        if self.journal is not None:
+            self.journal.invalidate()
+
+    def is_lazy(self):
+        return isinstance(self.store, LazyStore) and self.store.is_lazy()
+
+    def get_years(self):
+        if self.is_lazy():
+            return self.store.get_years()
+        return self.df.Year.unique()
+
+    def read_years(self, first, last):
+        if self.is_lazy():
+            return self.store.read_years(range(first, last + 1))
+        return self.df
+
+    def get_cube(self):
+        if self.cube is None:
+            self.cube = SummaryCube()
+            if self.is_lazy():
+                self.cube.add_totals(self.store.get_totals())
+            else:
+                self.cube.add(self.df)
+        return self.cube
+
+    def update_cube(self, rows, columns, sign=1):
+        # Move Only the Written Rows (Call with -1 Before and 1 After a Write)
+        if self.cube is not None and len(rows) and set(columns) & set(SummaryCube.columns):
+            self.cube.add(self.df.loc[rows, SummaryCube.columns], sign)
+
+    def update_store(self, column, value, where, equals):
+        # Lazy Stores Write in Place, the Cube Moves the Matching Totals
+        if not self.is_lazy():
+            return False
+        totals = None
+        if self.cube is not None and column in SummaryCube.columns:
+            totals = self.store.get_totals(where, equals)
+        if not self.store.update(column, value, where, equals):
+            return False
+        if totals is not None:
+            self.cube.add_totals(totals, -1)
+            self.cube.add_totals(totals.assign(**{column: value}))
+        return True
+
+    def invalidate_index(self):
+        self.rule_rows = None
+        self.memo_index = None
+
+    def build_ID_index(self):
+        # Row Edits Keep the ID Counts, Only a New Frame Rebuilds Them
+        if self.ids is None:
+            self.ids = Counter(self.df.ID.tolist())
+
+    def has_IDs(self, ids):
+        self.build_ID_index()
+        return np.array([ID in self.ids for ID in ids.tolist()], dtype=bool)
+
+    def add_IDs(self, ids):
+        if self.ids is not None:
+            self.ids.update(ids)
+
+    def remove_IDs(self, ids):
+        if self.ids is not None:
+            for ID in ids:
+                self.ids[ID] -= 1
+                if not self.ids[ID]:
+                    del self.ids[ID]
+
+    def build_index(self):
+        if self.rule_rows is None:
+            self.rule_rows = dict()
+            self.memo_index = MemoIndex()
+            for row, memo, keyword in zip(self.df.index, self.df.Memo, self.df.Keyword):
+                self.index_row(row, memo, keyword)
+
+    def index_row(self, row, memo, keyword):
+        if keyword == "None":
+            self.memo_index.add(memo, row)
+        else:
+            self.rule_rows.setdefault(keyword, set()).add(row)
+
+    def unindex_row(self, row, memo, keyword):
+        if keyword == "None":
+            self.memo_index.remove(memo, row)
+        elif keyword in self.rule_rows:
+            rows = self.rule_rows[keyword]
+            rows.discard(row)
+            if not rows:
+                del self.rule_rows[keyword]
+
+    def index_rows(self, rows):
+        if self.rule_rows is not None:
+            for row, memo, keyword in zip(rows, self.df.loc[rows, "Memo"], self.df.loc[rows, "Keyword"]):
+                self.index_row(row, memo, keyword)
+
+    def unindex_rows(self, rows):
+        if self.rule_rows is not None:
+            for row, memo, keyword in zip(rows, self.df.loc[rows, "Memo"], self.df.loc[rows, "Keyword"]):
+                self.unindex_row(row, memo, keyword)
+
+    def insert_blank_row(self):
+        super().insert_blank_row()
+        self.invalidate_index()
+        data = self.store.take(len(self.store) - 1)
+        self.add_IDs(data.ID.tolist())
+        if self.cube is not None:
+            self.cube.add(data)
+        if self.journal is not None:
+            self.journal.record({"op": "insert"})
+
+    def delete_row(self, row):
+        data = self.store.take(row)
+        self.remove_IDs(data.ID.tolist())
+        if self.cube is not None:
+            self.cube.add(data, -1)
+        super().delete_row(row)
+        self.invalidate_index()
+        if self.journal is not None:
+            self.journal.record({"op": "delete", "row": row})
+
+    def delete_rows(self, rows):
+        rows = sorted(set(rows))
+        data = self.df.loc[rows]
+        self.remove_IDs(data.ID.tolist())
+        if self.cube is not None:
+            self.cube.add(data, -1)
+        super().delete_rows(rows)
+        self.invalidate_index()
+        if self.journal is not None:
+            self.journal.record({"op": "delete_rows", "rows": rows}, len(rows))
+
+    def swap_rows(self, row1, row2):
+        self.unindex_rows([row1, row2])
+        super().swap_rows(row1, row2)
+        self.index_rows([row1, row2])
+        if self.journal is not None:
+            self.journal.record({"op": "swap", "rows": [row1, row2]})
+
+    def set_value(self, row, col, text):
+        self.update_cube([row], [self.columns[col]], -1)
+        value = super().set_value(row, col, text)
+        self.update_cube([row], [self.columns[col]])
+        if self.journal is not None:
+            self.journal.record_cells([row], [self.columns[col]], self.df.loc[[row]])
+        return value
+
+    def set_keyword(self, row, col, text):
+        self.unindex_rows([row])
+        value = super().set_keyword(row, col, text)
+        self.index_rows([row])
+        return value
+
+    def rename_budget_category(self, old_category, new_category):
+        if self.update_store("Category", new_category, "Category", old_category):
+            return
+        ledger_indexes = self.df.index[self.df.Category == old_category]
+        self.set_cells(ledger_indexes, "Category", new_category)
+
+    def set_cells(self, rows, columns, values):
+        # Bulk Writes Go Through Here so They Can be Journaled
+        if isinstance(columns, str):
+            columns = [columns]
+        self.update_cube(rows, columns, -1)
+        self.df.loc[rows, columns] = values
+        self.update_cube(rows, columns)
+        self.mark(rows, columns)
+        if self.journal is not None and len(rows):
+            self.journal.record_cells(rows, columns, self.df.loc[rows])
+
+    def replay(self, entries):
+        for entry in entries:
+            if entry["op"] == "cells":
+                for column, values in zip(entry["columns"], entry["values"]):
+                    self.df.loc[entry["rows"], column] = values
+            elif entry["op"] == "append":
+                data = pd.DataFrame(entry["data"], columns=self.columns)
+                self.append_rows(data.astype(entry["dtypes"]))
+            elif entry["op"] == "insert":
+                self.insert_blank_row()
+            elif entry["op"] == "delete":
+                self.delete_row(entry["row"])
+            elif entry["op"] == "delete_rows":
+                self.delete_rows(entry["rows"])
+            elif entry["op"] == "swap":
+                self.swap_rows(*entry["rows"])
+        self.invalidate_index()
+        self.cube = None
+
+    def auto_categorize(self, processes=None):
         # Extract Uncategorized Data
-        data_indexes = np.where(self.df.Keyword == "None")[0]
-        data = self.df.Memo[data_indexes]
-        # Find All Rule Matches
-        rule_indexes = []
-        ledger_indexes = []
+        data_indexes = self.df.index[self.df.Keyword == "None"]
+        return self.categorize(data_indexes, processes)
+
+    def categorize(self, data_indexes, processes=None):
+        if processes is None:
+            processes = self.model.processes
+        data_indexes = np.asarray(data_indexes, dtype=int)
+        data = self.df.loc[data_indexes, "Memo"]
+        # Encode Memos (Match Each Distinct Memo Once)
+        codes, memos = pd.factorize(data)
+        # Find All Rule Matches (Cached Memos Skip Matching)
         keywords = self.model.rules.df.Keyword
-        for k, keyword in enumerate(keywords):
-            index = data.str.contains(keyword, flags=re.I, regex=True)
-            index = list(np.where(index)[0])
-            rule_indexes += [k] * len(index)
-            ledger_indexes += data_indexes[index].tolist()
+        rule_indexes, memo_indexes = self.model.cache.match(memos.tolist(), self.model.rules, processes)
+        # Skip Rules Without a Budget Category (New Rules are Blank)
+        active = self.model.rules.df.Category.isin(self.model.budget.df.Category).to_numpy()
+        found = active[rule_indexes]
+        rule_indexes, memo_indexes = rule_indexes[found], memo_indexes[found]
         # Find Duplicate Matches
-        columns = ["Rule", "Ledger"]
-        duplicates = pd.DataFrame(zip(rule_indexes, ledger_indexes), columns=columns)
-        duplicates = duplicates.groupby(by="Ledger")
-        duplicates = duplicates["Rule"].apply(list)
-        # Find Missing by Taking Set Difference
-        missing = np.setdiff1d(data.index, duplicates.index).tolist()
-        # Assign Categories
-        for ledger_index, rule_index in zip(duplicates.index, duplicates.values):
-            if len(rule_index) == 1:  # Assign Only Match
-                keyword = keywords[rule_index[0]]
-                category = self.model.rules.df.loc[rule_index, "Category"].values
-                subcategory = self.model.rules.df.loc[rule_index, "Sub Category"].values
-                self.assign(ledger_index, rule_index, keyword, category, subcategory)
-            elif len(rule_index) > 1:
-                memo = self.df.Memo[ledger_index]
-                keyword1, keyword2 = keywords[rule_index[0]], keywords[rule_index[1]]
-                print(f"{memo} is {keyword1} and {keyword2}!")
+        counts = np.bincount(memo_indexes, minlength=len(memos))
+        single = counts[memo_indexes] == 1
+        memo_rules = np.full(len(memos) + 1, -1)  # Last Slot for Missing Memos
+        memo_rules[memo_indexes[single]] = rule_indexes[single]
+        # Find Missing Rows
+        row_counts = np.append(counts, 0)[codes]
+        missing = np.sort(data_indexes[row_counts == 0]).tolist()
+        # Assign Categories (Broadcast Memo Matches to Rows)
+        row_rules = memo_rules[codes]
+        assigned = row_rules >= 0
+        self.assign_many(data_indexes[assigned], row_rules[assigned])
+        columns = ["Rule", "Memo"]
+        duplicates = pd.DataFrame(zip(rule_indexes[~single], memo_indexes[~single]), columns=columns)
+        duplicates = duplicates.groupby(by="Memo")["Rule"].apply(list)
+        for memo_index, rule_index in zip(duplicates.index, duplicates.values):
+            memo = memos[memo_index]
+            keyword1, keyword2 = keywords[rule_index[0]], keywords[rule_index[1]]
+            print(f"{memo} is {keyword1} and {keyword2}!")
         return missing
 
-    def assign(self, ledger_index, rule_index, keyword, category, subcategory):
-        self.model.rules.df.loc[rule_index, "Count"] += 1
-        old_keyword = self.df.loc[ledger_index, "Keyword"]
-        if old_keyword != "None":
-            old_ledger_index = np.where(self.model.rules.df.Keyword == old_keyword)[0]
-            self.model.rules.df.loc[old_ledger_index, "Count"] -= 1
-        self.df.loc[ledger_index, "Keyword"] = keyword
-        self.df.loc[ledger_index, "Category"] = category
-        self.df.loc[ledger_index, "Sub Category"] = subcategory
+    def assign_many(self, ledger_indexes, rule_indexes):
+        rules = self.model.rules.df
+        ledger_indexes = np.asarray(ledger_indexes, dtype=int)
+        rule_indexes = np.asarray(rule_indexes, dtype=int)
+        if len(ledger_indexes) == 0:
+            return
+        # Count Changes (New Rules Up, Old Rules Down)
+        delta = np.bincount(rule_indexes, minlength=len(rules))
+        old_keywords = self.df.loc[ledger_indexes, "Keyword"]
+        old_counts = old_keywords[old_keywords != "None"].value_counts()
+        for old_keyword, count in old_counts.items():
+            delta[self.model.rules.get_rows(old_keyword)] -= count
+        changed = np.flatnonzero(delta)
+        self.model.rules.add_counts(rules.index[changed], delta[changed])
+        # Update Index
+        if self.rule_rows is not None:
+            memos = self.df.loc[ledger_indexes, "Memo"]
+            new_keywords = rules.Keyword.values[rule_indexes]
+            for row, memo, old_keyword, new_keyword in zip(ledger_indexes, memos,
+                                                           old_keywords, new_keywords):
+                self.unindex_row(row, memo, old_keyword)
+                self.index_row(row, memo, new_keyword)
+        # Write Assignments
+        columns = ["Keyword", "Category", "Sub Category"]
+        self.set_cells(ledger_indexes, columns, rules[columns].values[rule_indexes])
+
+    def release(self, ledger_indexes, keyword):
+        self.model.rules.add_counts(self.model.rules.get_rows(keyword), -len(ledger_indexes))
+        for row in ledger_indexes:
+            memo = self.df.loc[row, "Memo"]
+            self.unindex_row(row, memo, keyword)
+            self.index_row(row, memo, "None")
+        self.set_cells(ledger_indexes, ["Keyword", "Category", "Sub Category"], "None")
+
+    def rename_keyword(self, old_keyword, new_keyword):
+        self.build_index()
+        # Re-Check Rows Matched by Old Keyword
+        ledger_indexes = sorted(self.rule_rows.pop(old_keyword, ()))
+        memos = self.df.loc[ledger_indexes, "Memo"]
+        codes, uniques = pd.factorize(memos)
+        pattern = re.compile(new_keyword, re.I)
+        found = np.array([isinstance(memo, str) and bool(pattern.search(memo))
+                          for memo in uniques], dtype=bool)
+        for memo in uniques[~found]:
+            print(f"{memo} does not contain new keyword {new_keyword}")
+        found = np.append(found, False)[codes]
+        keep = memos.index[found].tolist()
+        lost = memos.index[~found].tolist()
+        self.set_cells(keep, "Keyword", new_keyword)
+        self.rule_rows.setdefault(new_keyword, set()).update(keep)
+        self.release(lost, new_keyword)
+        # Re-Evaluate Lost Rows and Memos Either Keyword Could Match
+        if not isinstance(self, DuplicateData):
+            candidates = self.memo_index.candidates(old_keyword) | self.memo_index.candidates(new_keyword)
+            self.categorize(sorted(set(lost).union(self.memo_index.get_rows(candidates))))
+
+    def delete_keyword(self, keyword):
+        self.build_index()
+        lost = sorted(self.rule_rows.get(keyword, ()))
+        self.release(lost, keyword)
+        if not isinstance(self, DuplicateData):
+            candidates = self.memo_index.candidates(keyword)
+            self.categorize(sorted(set(lost).union(self.memo_index.get_rows(candidates))))
+
+    def categorize_keyword(self, keyword):
+        if not isinstance(self, DuplicateData):
+            self.build_index()
+            candidates = self.memo_index.candidates(keyword)
+            self.categorize(self.memo_index.get_rows(candidates))
+
+    def recategorize_keyword(self, keyword, new_category):
+        if self.update_store("Category", new_category, "Keyword", keyword):
+            return
+        self.build_index()
+        ledger_indexes = sorted(self.rule_rows.get(keyword, ()))
+        self.set_cells(ledger_indexes, "Category", new_category)
+
+    def resubcategorize_keyword(self, keyword, new_subcategory):
+        if self.update_store("Sub Category", new_subcategory, "Keyword", keyword):
+            return
+        self.build_index()
+        ledger_indexes = sorted(self.rule_rows.get(keyword, ()))
+        self.set_cells(ledger_indexes, "Sub Category", new_subcategory)
 
     def add_transactions(self, new_data):
-        self.df = pd.concat([self.df, new_data])
-        self.df.reset_index(drop=True, inplace=True)
+        new_data = new_data.reset_index(drop=True)
         if not isinstance(self, DuplicateData):
-            duplicate_indexes = self.df.duplicated(subset="ID", keep="first")
-            duplicates = self.df[duplicate_indexes]
-            self.model.duplicates.add_transactions(duplicates)
-            self.df.drop(np.where(duplicate_indexes)[0], inplace=True)
+            # Check Incoming IDs Against the Ledger and Earlier Rows of the Batch
+            duplicate_indexes = self.has_IDs(new_data.ID) | new_data.ID.duplicated(keep="first").values
+            if duplicate_indexes.any():
+                self.model.duplicates.add_transactions(new_data[duplicate_indexes])
+                new_data = new_data[~duplicate_indexes]
+        self.append_rows(new_data)
+
+    def move_near_duplicates(self, days=1, similarity=0.8):
+        # Same Amount, Dates within a Few Days and Similar Memos
+        rows = NearDuplicateFinder(days, similarity).find(self.df)
+        if rows:
+            self.model.duplicates.add_transactions(self.df.loc[rows])
+            self.delete_rows(rows)
+        print(f"{len(rows)} near duplicates found.")
+        return rows
+
+    def append_rows(self, data):
+        # Append with New Row Labels (Keeps the ID and Dependency Indexes)
+        start = len(self.store)
+        data = data.set_axis(pd.RangeIndex(start, start + len(data)))
+        self.store.append(data)
+        self.changes.add_all()
+        if self.cube is not None:
+            self.cube.add(data)
+        if self.journal is not None and len(data):
+            self.journal.record_rows(data)
+        self.add_IDs(data.ID.tolist())
+        if self.rule_rows is not None:
+            for row, memo, keyword in zip(data.index, data.Memo, data.Keyword):
+                self.index_row(row, memo, keyword)
 
 
 class ImportData(LedgerData):
@@ -354,54 +802,135 @@ class ImportData(LedgerData):
             data = self.empty_data()
         super().__init__(model, data, name)
         
-    def import_transactions(self, file_name):
-        def get_ID(year, month, day, memo, amount):
-            dl = "|"
-            if isinstance(year, int):
-                ID = dl.join([str(year), str(month), str(day), memo, str(amount)])
-            else:
-                year, month, day, amount = (year.apply(str), month.apply(str),
-                                            day.apply(str), amount.apply(str))
-                ID = year + dl + month + dl + day + dl + memo + dl + amount
-            return ID
-        # Parse File
+    def import_transactions(self, file_name, chunk_size=100000):
+        # Parse File (Single Pass)
         with open(file_name) as file:
-            for n, line in enumerate(file):
-                if "" not in line.split(","):  # Find First Complete Line
-                    break
-            else:
+            header = self.read_header(file)
+            if header is None:
                 print(f"Could not Parse {file_name}.")
                 return None
-        # Read Data
-        df = pd.read_csv(file_name, skiprows=n)
-        # Extract Data
-        labels = set(df.columns)
-        for column in ["Trans. Date", "Transaction Date", "Date"]:
-            if column in labels:
-                date = pd.to_datetime(df[column])
-                day = date.dt.day
-                month = date.dt.month
-                year = date.dt.year
-                break
-        memo = df["Description"].replace("[-,.*#&']", "", regex=True)  # RegEx
-        df.fillna(0.0, inplace=True)  # Fill in Missing Zeros
-        if "Credit" in labels:
-            credit = df.Credit.replace(r"[$,]", "", regex=True).astype(float)
-            debit = df.Debit.replace(r"[$,]", "", regex=True).astype(float)
-            amount = credit - debit
-        elif "Amount" in labels:
-            amount = df.Amount.replace(r"[$,]", "", regex=True).astype(float)
-        ID = get_ID(year, month, day, memo, amount)
-        N = len(df)
-        keyword = ["None"] * N
-        category = ["None"] * N
-        subcategory = ["None"] * N
-        # New DataFrame
-        data = zip(year, month, day, memo, amount, 
-                   keyword, category, subcategory, ID)
-        self.df = pd.DataFrame(data, columns=self.columns)
+            known = tuple(header) in self.model.profiles
+            # Read Data in Chunks
+            self.df = pd.DataFrame(self.empty_data(), columns=self.columns)
+            try:
+                for data in self.read_chunks(file, header, self.model.profiles, chunk_size):
+                    data = self.check_IDs(data)
+                    start = len(self.store)
+                    self.append_rows(data)
+                    self.categorize(range(start, len(self.store)))
+            except ValueError:
+                if not known:
+                    raise
+                print(f"{file_name} does not match its saved parser profile.")
+                self.release_all()
+                del self.model.profiles[tuple(header)]
+                return self.import_transactions(file_name, chunk_size)
+
+    def import_files(self, file_names, processes=None):
+        # Parse Files in Parallel
+        profiles = [self.model.profiles] * len(file_names)
+        if len(file_names) > 1:
+            processes = min(processes or os.cpu_count() or 1, len(file_names))
+            with ProcessPoolExecutor(processes) as pool:
+                results = list(pool.map(self.read_file, file_names, profiles))
+        else:
+            results = list(map(self.read_file, file_names, profiles))
+        frames = []
+        for n, (file_name, (data, profile)) in enumerate(zip(file_names, results)):
+            if data is None:
+                print(f"Could not Parse {file_name}.")
+            else:
+                self.model.profiles[profile.header] = profile
+                frames.append(data.assign(File=n))
+        if not frames:
+            return None
+        # Merge and Remove IDs Already Seen in an Earlier File
+        data = self.check_IDs(pd.concat(frames, ignore_index=True))
+        first_file = data.groupby(by="ID")["File"].transform("min")
+        duplicates = data.File != first_file
+        if duplicates.any():
+            self.model.duplicates.add_transactions(data[duplicates].drop(columns="File"))
+        self.df = data[~duplicates].drop(columns="File").reset_index(drop=True)
         self.auto_categorize()
 
+    @classmethod
+    def read_file(cls, file_name, profiles, chunk_size=100000):
+        profiles = dict(profiles)
+        with open(file_name) as file:
+            header = cls.read_header(file)
+            if header is None:
+                return None, None
+            try:
+                frames = list(cls.read_chunks(file, header, profiles, chunk_size))
+            except ValueError:
+                if tuple(header) not in profiles:
+                    raise
+                print(f"{file_name} does not match its saved parser profile.")
+                del profiles[tuple(header)]
+                return cls.read_file(file_name, profiles, chunk_size)
+        profile = profiles.get(tuple(header))
+        if profile is None:
+            return None, None
+        if not frames:
+            return pd.DataFrame(columns=[*cls.columns, "Key"]), profile
+        return pd.concat(frames, ignore_index=True), profile
+
+    @staticmethod
+    def read_header(file):
+        for line in file:
+            if "" not in line.split(","):  # Find First Complete Line
+                return next(csv.reader([line]))
+        return None
+
+    @classmethod
+    def read_chunks(cls, file, header, profiles, chunk_size):
+        # Known Banks Use Fixed Dtypes and Date Format, New Ones are Read as Text
+        profile = profiles.get(tuple(header))
+        if profile is None:
+            options = {"dtype": str}
+        else:
+            options = profile.read_options()
+        for df in pd.read_csv(file, names=header, chunksize=chunk_size, **options):
+            if profile is None:
+                profile = ParserProfile.detect(header, df)
+                if profile is None:
+                    print(f"Could not find date, description and amount columns in {header}.")
+                    return
+                profiles[profile.header] = profile
+            yield cls.extract_transactions(df, profile)
+
+    @classmethod
+    def extract_transactions(cls, df, profile):
+        # Extract Data
+        year, month, day, memo, amount = profile.extract(df)
+        key = cls.get_keys(year, month, day, memo, amount)
+        ID = cls.hash_keys(key)
+        # New DataFrame (Keys are Kept for check_IDs)
+        data = {"Year": year, "Month": month, "Day": day, "Memo": memo, "Amount": amount,
+                "Keyword": "None", "Category": "None", "Sub Category": "None", "ID": ID,
+                "Key": key}
+        data = pd.DataFrame(data, columns=[*cls.columns, "Key"])
+        data.reset_index(drop=True, inplace=True)
+        return data
+
+    def check_IDs(self, data):
+        # Re-hash (salted) any ID whose hash is shared by a different key in the batch
+        # (IDs Already in the Ledger are Duplicates, Found by add_transactions)
+        keys = data.pop("Key")
+        salt = 0
+        while True:
+            clash = (keys != keys.groupby(data.ID).transform("first")).values
+            if not clash.any():
+                return data
+            salt += 1
+            print(f"{clash.sum()} ID collisions, re-hashing with salt {salt}.")
+            data.loc[clash, "ID"] = self.hash_keys(keys[clash] + f"|{salt}").values
+
+    def release_all(self):
+        self.build_index()
+        for keyword, rows in list(self.rule_rows.items()):
+            self.release(sorted(rows), keyword)
+
     def accept_categorized(self):
         index = self.df.Category == "None"
         new_data = self.df[~index]
@@ -439,18 +968,20 @@ class SummaryTable:
         self.table = pd.DataFrame()
         
     def summarize(self, start, stop):
-        year = self.ledger.df.Year
-        month = self.ledger.df.Month
-        day = self.ledger.df.Day
-        months = len(month.unique())
-        num_days = Date(year, month, day).value
-        start_days = Date(*start).value
-        end_days = Date(*stop).value
-        index = np.all([start_days <= num_days, num_days <= end_days], axis=0)
-        table = self.ledger.df[index].copy()
-        table = pd.concat([self.placeholder.df, table])
-        table = pd.pivot_table(table, values="Amount", 
-                               index="Category", columns="Month", aggfunc=sum)
+        cube = self.ledger.get_cube()
+        months = len(cube.get_months())
+        if list(start[1:]) == [1, 1] and list(stop[1:]) == [12, 31]:
+            table = cube.get_table(range(start[0], stop[0] + 1))  # Whole Years
+        else:
+            df = self.ledger.read_years(start[0], stop[0])
+            num_days = Date(df.Year, df.Month, df.Day).value
+            start_days = Date(*start).value
+            end_days = Date(*stop).value
+            index = np.all([start_days <= num_days, num_days <= end_days], axis=0)
+            table = df[index].copy()
+            table = pd.concat([self.placeholder.df, table])
+            table = pd.pivot_table(table, values="Amount", 
+                                   index="Category", columns="Month", aggfunc=sum)
         table = table.reindex(self.budget.df.Category)
         table.columns = Date.month_names
         table.fillna(0.0, inplace=True)
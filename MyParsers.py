@@ -0,0 +1,84 @@
+import pandas as pd
+
+
+class ParserProfile:
+    date_columns = ("Trans. Date", "Transaction Date", "Date")
+    date_formats = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%Y/%m/%d",
+                    "%m-%d-%Y", "%d-%b-%Y", "%b %d, %Y")
+    memo_table = str.maketrans("", "", "-,.*#&'")
+
+    def __init__(self, header, date_column, date_format, layout, numeric):
+        self.header = tuple(header)
+        self.date_column = date_column
+        self.date_format = date_format
+        self.layout = layout
+        self.numeric = numeric
+
+    @property
+    def amount_columns(self):
+        if self.layout == "Credit":
+            return ("Credit", "Debit")
+        return ("Amount", )
+
+    @classmethod
+    def detect(cls, header, df):
+        # Work Out the Layout from the First (Text) Chunk of a File
+        labels = set(header)
+        for date_column in cls.date_columns:
+            if date_column in labels:
+                break
+        else:
+            return None
+        if "Description" not in labels:
+            return None
+        if "Credit" in labels and "Debit" in labels:
+            layout = "Credit"
+        elif "Amount" in labels:
+            layout = "Amount"
+        else:
+            return None
+        dates = df[date_column].dropna()
+        date_format = None
+        for text in cls.date_formats:
+            try:
+                pd.to_datetime(dates, format=text)
+            except ValueError:
+                continue
+            date_format = text
+            break
+        profile = cls(header, date_column, date_format, layout, False)
+        amounts = pd.concat([df[column].dropna() for column in profile.amount_columns])
+        profile.numeric = not amounts.str.contains("$", regex=False).any()
+        return profile
+
+    def read_options(self):
+        dtype = {self.date_column: str, "Description": str}
+        for column in self.amount_columns:
+            dtype[column] = float if self.numeric else str
+        return {"usecols": list(dtype), "dtype": dtype, "thousands": ","}
+
+    def extract(self, df):
+        date = pd.to_datetime(df[self.date_column], format=self.date_format)
+        memo = df["Description"].str.translate(self.memo_table)
+        amounts = [self.to_float(df[column]) for column in self.amount_columns]
+        if self.layout == "Credit":
+            amount = amounts[0] - amounts[1]
+        else:
+            amount = amounts[0]
+        return date.dt.year, date.dt.month, date.dt.day, memo, amount
+
+    @staticmethod
+    def to_float(column):
+        if column.dtype != float:  # Text Amounts like "$1,000.50"
+            column = column.str.replace("$", "", regex=False).str.replace(",", "", regex=False)
+        return column.astype(float).fillna(0.0)  # Fill in Missing Zeros
+
+    def to_dict(self):
+        return {"header": list(self.header), "date_column": self.date_column,
+                "date_format": self.date_format, "layout": self.layout,
+                "numeric": self.numeric}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["header"], data["date_column"], data["date_format"],
+                   data["layout"], data["numeric"])
@@ -0,0 +1,581 @@
+import io
+import os
+import json
+import zlib
+import struct
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from zipfile import ZipFile
+from collections import OrderedDict
+
+
+class RowStore:
+    compact_size = 64  # Pending Chunks Merged at Once
+
+    def __init__(self, df):
+        if not df.index.equals(pd.RangeIndex(len(df))):  # Row Labels are Positions
+            df = df.reset_index(drop=True)
+        self.frame = df
+        self.chunks = []
+        self.deleted = []
+        self.size = len(df)
+
+    def __len__(self):
+        return self.size
+
+    def get(self):
+        # Materialize Pending Appends and Deletes Only When a DataFrame is Needed
+        if self.chunks or self.deleted:
+            self.compact()
+        return self.frame
+
+    def append(self, data):
+        # Amortized O(1): Rows Wait in a Chunk List Until the Next Compaction
+        if len(data):
+            self.chunks.append(data)
+            self.size += len(data)
+            if len(self.chunks) >= self.compact_size:
+                self.compact()
+
+    def delete(self, row):
+        self.delete_rows([row])
+
+    def delete_rows(self, rows):
+        # Tombstone the Physical Positions of Visible Rows
+        positions = [self.position(row) for row in rows]
+        self.deleted = sorted(self.deleted + positions)
+        self.size -= len(positions)
+        if len(self.deleted) >= self.compact_size:
+            self.compact()
+
+    def position(self, row):
+        if not 0 <= row < self.size:
+            raise KeyError(row)
+        position = row
+        for deleted in self.deleted:
+            if deleted <= position:
+                position += 1
+            else:
+                break
+        return position
+
+    def locate(self, row):
+        # (Frame, Position) Holding a Visible Row, Without Compacting
+        position = self.position(row)
+        for frame in [self.frame, *self.chunks]:
+            if position < len(frame):
+                return frame, position
+            position -= len(frame)
+        raise KeyError(row)
+
+    def take(self, row):
+        frame, position = self.locate(row)
+        return frame.iloc[[position]]
+
+    def get_value(self, row, col):
+        frame, position = self.locate(row)
+        return frame.iat[position, col]
+
+    def compact(self):
+        if self.chunks:
+            frames = [self.frame] if len(self.frame) else []  # Keep the Dtypes of New Rows
+            df = pd.concat(frames + self.chunks, ignore_index=True)
+        else:
+            df = self.frame
+        if self.deleted:
+            keep = np.ones(len(df), dtype=bool)
+            keep[self.deleted] = False
+            df = df[keep].reset_index(drop=True)
+        self.frame = df
+        self.chunks = []
+        self.deleted = []
+
+
+class LazyStore(RowStore):
+    def __init__(self, size):
+        self.frame = None  # Read by load() on First Use
+        self.chunks = []
+        self.deleted = []
+        self.size = size
+
+    def is_lazy(self):
+        return self.frame is None and not self.chunks and not self.deleted
+
+    def get(self):
+        self.load()
+        return super().get()
+
+    def compact(self):
+        self.load()
+        super().compact()
+
+    def locate(self, row):
+        self.load()
+        return super().locate(row)
+
+    def update(self, column, value, where, equals):
+        return False  # Cannot Write Without Loading
+
+    def get_totals(self, where=None, equals=None):
+        df = self.get()
+        if where is not None:
+            df = df[df[where] == equals]
+        return SummaryCube.totals(df)
+
+
+class PartitionStore(LazyStore):
+    max_partitions = 4  # Resident Partitions (Least Recently Used Dropped)
+
+    def __init__(self, file_name, schema):
+        super().__init__(schema["rows"])
+        self.file_name = file_name
+        self.schema = schema
+        self.partitions = OrderedDict()
+
+    def load(self):
+        # Whole Ledger (Rows Back in Their Saved Order)
+        if self.frame is not None:
+            return
+        frames = [self.read_partition(year) for year in self.schema["partitions"]]
+        if frames:
+            self.frame = pd.concat(frames).sort_index()
+        else:
+            self.frame = ColumnFormat.empty_table(self.schema)
+        self.partitions.clear()
+
+    def read_partition(self, year):
+        if year in self.partitions:
+            self.partitions.move_to_end(year)
+            return self.partitions[year]
+        with ZipFile(self.file_name, 'r') as zip_file:
+            partition = self.schema["partitions"][year]
+            df = ColumnFormat.load_table(zip_file, partition)
+            df.index = ColumnFormat.load_array(zip_file, partition["positions"])
+        self.partitions[year] = df
+        if len(self.partitions) > self.max_partitions:
+            self.partitions.popitem(last=False)
+        return df
+
+    def get_years(self):
+        return np.array(sorted(int(year) for year in self.schema["partitions"]
+                               if year != ColumnFormat.unknown), dtype=int)
+
+    def read_years(self, years):
+        years = [str(year) for year in years if str(year) in self.schema["partitions"]]
+        if not years:
+            return ColumnFormat.empty_table(self.schema)
+        return pd.concat([self.read_partition(year) for year in years]).sort_index()
+
+    def get_totals(self, where=None, equals=None):
+        # Category x Year x Month Totals from the Metadata Index (No Rows Read)
+        if where is not None:
+            return super().get_totals(where, equals)
+        totals = []
+        for year, partition in self.schema["partitions"].items():
+            if year == ColumnFormat.unknown:
+                continue  # Not in Any Summary
+            if "counts" not in partition:  # Saved Before Counts were Kept
+                totals.append(SummaryCube.totals(self.read_partition(year)))
+                continue
+            rows = [(category, int(year), int(month), value, partition["counts"][category][month])
+                    for category, months in partition["sums"].items()
+                    for month, value in months.items()]
+            totals.append(pd.DataFrame(rows, columns=SummaryCube.totals_columns))
+        if not totals:
+            return pd.DataFrame(columns=SummaryCube.totals_columns)
+        return pd.concat(totals, ignore_index=True)
+
+
+class SQLiteStore(LazyStore):
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        super().__init__(database.count(name))
+
+    def load(self):
+        if self.frame is None:
+            self.frame = self.database.load_table(self.name).reset_index(drop=True)
+
+    def get_years(self):
+        return self.database.query(f'SELECT DISTINCT Year FROM "{self.name}" ORDER BY Year').Year.to_numpy()
+
+    def read_years(self, years):
+        years = list(years)
+        return self.database.load_table(self.name, "WHERE Year BETWEEN ? AND ?", (years[0], years[-1]))
+
+    def get_totals(self, where=None, equals=None):
+        query = (f'SELECT Category, Year, Month, SUM(Amount) AS Amount, COUNT(*) AS Count '
+                 f'FROM "{self.name}"')
+        params = ()
+        if where is not None:
+            query += f' WHERE "{where}" = ?'
+            params = (equals, )
+        return self.database.query(query + ' GROUP BY Category, Year, Month', params)
+
+    def update(self, column, value, where, equals):
+        if self.database.saving:
+            return False  # The Save Worker is Writing the File
+        self.database.update(self.name, column, value, where, equals)
+        return True
+
+
+class Database:
+    indexes = {"Keyword": ("Keyword", ), "Category": ("Category", ), "ID": ("ID", ),
+               "Date": ("Year", "Month", "Day"), "Summary": ("Year", "Category", "Month", "Amount")}
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        # Opened on One Thread and Used on Another, Transactions are Managed Explicitly
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+        self.saving = False  # Set While a Save Worker Has its Own Connection Open
+
+    def has_table(self, name):
+        query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?"
+        with self.lock:
+            return self.connection.execute(query, (name, )).fetchone() is not None
+
+    def count(self, name):
+        with self.lock:
+            return self.connection.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+
+    def query(self, query, parameters=()):
+        with self.lock:
+            return pd.read_sql_query(query, self.connection, params=parameters)
+
+    def begin(self):
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+
+    @staticmethod
+    def get_type(series):
+        if series.dtype.kind in "iub":
+            return "INTEGER"
+        elif series.dtype.kind == "f":
+            return "REAL"
+        return "TEXT"
+
+    def save_table(self, name, df):
+        # Rows Keep Their Order as rowid, 64-bit IDs are Stored as Signed Integers
+        df = df.reset_index(drop=True)
+        if "ID" in df.columns:
+            df["ID"] = df.ID.to_numpy(dtype=np.uint64).view(np.int64)
+        columns = ", ".join(f'"{column}" {self.get_type(df[column])}' for column in df.columns)
+        values = []
+        for column in df.columns:
+            series = df[column]
+            if self.get_type(series) == "TEXT":
+                series = series.astype(object).where(series.notna(), None)
+            values.append(series.tolist())
+        markers = ", ".join("?" * len(df.columns))
+        with self.lock:
+            self.begin()
+            self.connection.execute(f'DROP TABLE IF EXISTS "{name}"')
+            self.connection.execute(f'CREATE TABLE "{name}" ({columns})')
+            self.connection.executemany(f'INSERT INTO "{name}" VALUES ({markers})', zip(*values))
+            for index, columns in self.indexes.items():
+                if set(columns).issubset(df.columns):
+                    columns = ", ".join(f'"{column}"' for column in columns)
+                    self.connection.execute(f'CREATE INDEX "{name}_{index}" ON "{name}" ({columns})')
+
+    def load_table(self, name, where="", parameters=()):
+        df = self.query(f'SELECT rowid - 1 AS "Row", * FROM "{name}" {where} ORDER BY rowid', parameters)
+        df = df.set_index("Row")
+        df.index.name = None
+        if "ID" in df.columns:
+            df["ID"] = df.ID.to_numpy(dtype=np.int64).view(np.uint64)
+        return df
+
+    def update(self, name, column, value, where, equals):
+        query = f'UPDATE "{name}" SET "{column}" = ? WHERE "{where}" = ?'
+        with self.lock:
+            self.begin()
+            self.connection.execute(query, (value, equals))
+
+    def save_setting(self, key, value):
+        with self.lock:
+            self.begin()
+            self.connection.execute("CREATE TABLE IF NOT EXISTS Settings (Key TEXT PRIMARY KEY, Value TEXT)")
+            self.connection.execute("INSERT OR REPLACE INTO Settings VALUES (?, ?)", (key, value))
+
+    def load_setting(self, key):
+        if not self.has_table("Settings"):
+            return None
+        with self.lock:
+            row = self.connection.execute("SELECT Value FROM Settings WHERE Key=?", (key, )).fetchone()
+        return None if row is None else row[0]
+
+    def commit(self):
+        with self.lock:
+            if self.connection.in_transaction:
+                self.connection.commit()
+
+    def rollback(self):
+        with self.lock:
+            if self.connection.in_transaction:
+                self.connection.rollback()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class ColumnFormat:
+    version = 3
+    unknown = "Unknown"  # Partition for Rows Without a Year
+
+    @staticmethod
+    def save_array(zip_file, member, array):
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        zip_file.writestr(member, buffer.getvalue())
+
+    @staticmethod
+    def load_array(zip_file, member):
+        return np.load(io.BytesIO(zip_file.read(member)), allow_pickle=False)
+
+    @classmethod
+    def save_table(cls, zip_file, df, name):
+        # One .npy Member per Column, Text Columns as Codes into a Value List
+        columns = []
+        for n, column in enumerate(df.columns):
+            series = df[column]
+            member = f"{name}/{n}.npy"
+            item = {"name": column, "dtype": str(series.dtype), "member": member}
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                cls.save_array(zip_file, member, series.to_numpy())
+            else:
+                codes, values = pd.factorize(series)
+                cls.save_array(zip_file, member, codes.astype(np.int32))
+                item["values"] = [str(value) for value in values]
+            columns.append(item)
+        return {"rows": len(df), "columns": columns}
+
+    @classmethod
+    def load_table(cls, zip_file, schema):
+        data = dict()
+        for item in schema["columns"]:
+            array = cls.load_array(zip_file, item["member"])
+            if "values" in item:
+                values = np.array(item["values"] + [None], dtype=object)  # Code -1 is Missing
+                data[item["name"]] = pd.Series(values[array], dtype=item["dtype"])
+            else:
+                data[item["name"]] = array
+        return pd.DataFrame(data, columns=[item["name"] for item in schema["columns"]])
+
+    @classmethod
+    def save_partitions(cls, zip_file, df, name, column="Year", progress=None):
+        # One Table per Year plus a Small Metadata Index
+        schema = cls.save_table(zip_file, df.iloc[:0], name)
+        schema["rows"] = len(df)
+        schema["partitions"] = dict()
+        groups = df.groupby(column, sort=True, dropna=False)
+        for n, (year, part) in enumerate(groups):
+            year = cls.unknown if pd.isna(year) else str(int(year))
+            prefix = f"{name}/{year}"
+            partition = cls.save_table(zip_file, part, prefix)
+            partition["positions"] = f"{prefix}/positions.npy"
+            cls.save_array(zip_file, partition["positions"], part.index.to_numpy(dtype=np.int64))
+            totals = part.groupby(["Category", "Month"]).Amount.agg(["sum", "size"])
+            partition["sums"] = dict()
+            partition["counts"] = dict()
+            for (category, month), value, count in zip(totals.index, totals["sum"], totals["size"]):
+                partition["sums"].setdefault(category, dict())[str(int(month))] = float(value)
+                partition["counts"].setdefault(category, dict())[str(int(month))] = int(count)
+            schema["partitions"][year] = partition
+            if progress is not None:
+                progress(n + 1, groups.ngroups)
+        return schema
+
+    @staticmethod
+    def empty_table(schema):
+        data = {item["name"]: pd.Series([], dtype=item["dtype"]) for item in schema["columns"]}
+        return pd.DataFrame(data)
+
+    @classmethod
+    def save_manifest(cls, zip_file, tables, snapshot=None):
+        manifest = {"version": cls.version, "tables": tables, "snapshot": snapshot}
+        zip_file.writestr("Manifest.json", json.dumps(manifest))
+
+    @staticmethod
+    def load_manifest(zip_file):
+        if "Manifest.json" not in zip_file.namelist():  # Older CSV Files
+            return None
+        return json.loads(zip_file.read("Manifest.json").decode())
+
+
+class Journal:
+    threshold = 100000  # Journaled Changes Before a New Snapshot
+    max_entries = 50
+    header = struct.Struct("<QI")  # Record Length and CRC32
+
+    def __init__(self):
+        self.file_name = None
+        self.entries = []
+        self.pending = 0
+        self.stale = True  # Changes that Need a Full Snapshot
+        self.count = 0  # Entries Already in the File
+        self.size = 0
+        self.snapshot = None  # Entries Only Apply to the Snapshot They Were Made Against
+
+    def record(self, entry, size=1):
+        if not self.stale:
+            self.entries.append(entry)
+            self.pending += size
+
+    def record_cells(self, rows, columns, values):
+        values = [values[column].tolist() for column in columns]
+        self.record({"op": "cells", "rows": np.asarray(rows).tolist(), "columns": list(columns),
+                     "values": values}, len(rows))
+
+    def record_rows(self, data):
+        dtypes = {column: str(dtype) for column, dtype in data.dtypes.items()}
+        rows = {column: data[column].tolist() for column in data.columns}
+        self.record({"op": "append", "data": rows, "dtypes": dtypes}, len(data))
+
+    def invalidate(self):
+        self.stale = True
+        self.entries = []
+        self.pending = 0
+
+    def can_append(self, file_name):
+        if self.stale or file_name != self.file_name or not os.path.exists(file_name):
+            return False
+        return self.size + self.pending < self.threshold and self.count < self.max_entries
+
+    def reset(self, file_name=None, count=0, size=0, snapshot=None):
+        # The File Holds Everything Recorded so Far
+        self.file_name = file_name
+        self.entries = []
+        self.pending = 0
+        self.stale = False
+        self.count = count
+        self.size = size
+        self.snapshot = snapshot
+
+    def take(self):
+        # Changes for the Next Entry (Edits Made While Saving Start a New One)
+        entries, pending = self.entries, self.pending
+        self.entries = []
+        self.pending = 0
+        return entries, pending
+
+    def appended(self, file_name, pending):
+        if file_name == self.file_name:
+            self.count += 1
+            self.size += pending
+
+    @classmethod
+    def save_entry(cls, zip_file, count, snapshot, tables, profiles, entries, pending):
+        entry = {"snapshot": snapshot, "tables": tables, "profiles": profiles,
+                 "ledger": entries, "size": pending}
+        zip_file.writestr(f"{cls.prefix(count)}.json", json.dumps(entry))
+
+    @staticmethod
+    def prefix(count):
+        return f"Journal/{count:06d}"
+
+    @staticmethod
+    def load_entries(zip_file):
+        names = sorted(name for name in zip_file.namelist()
+                       if name.startswith("Journal/") and name.endswith(".json"))
+        return [json.loads(zip_file.read(name).decode()) for name in names]
+
+    @staticmethod
+    def path(file_name):
+        return f"{file_name}.journal"
+
+    @classmethod
+    def append_record(cls, file_name, record):
+        # Append-Only Next to the Snapshot, a Torn Record from a Crash is Cut Off First
+        with open(cls.path(file_name), "a+b") as file:
+            file.truncate(cls.valid_end(file))
+            file.write(cls.header.pack(len(record), zlib.crc32(record)) + record)
+            file.flush()
+            os.fsync(file.fileno())
+
+    @classmethod
+    def valid_end(cls, file):
+        size = file.seek(0, os.SEEK_END)
+        offset = 0
+        while offset + cls.header.size <= size:
+            file.seek(offset)
+            length, crc = cls.header.unpack(file.read(cls.header.size))
+            if offset + cls.header.size + length > size:
+                break
+            offset += cls.header.size + length
+        return offset
+
+    @classmethod
+    def read_records(cls, file_name):
+        if not os.path.exists(cls.path(file_name)):
+            return []
+        with open(cls.path(file_name), "rb") as file:
+            data = file.read()
+        records = []
+        offset = 0
+        while offset + cls.header.size <= len(data):
+            length, crc = cls.header.unpack_from(data, offset)
+            record = data[offset + cls.header.size:offset + cls.header.size + length]
+            if len(record) < length or zlib.crc32(record) != crc:
+                break
+            records.append(record)
+            offset += cls.header.size + length
+        return records
+
+    @classmethod
+    def remove(cls, file_name):
+        if os.path.exists(cls.path(file_name)):
+            os.remove(cls.path(file_name))
+
+
+class SummaryCube:
+    columns = ["Category", "Year", "Month", "Amount"]
+    totals_columns = ["Category", "Year", "Month", "Amount", "Count"]
+
+    def __init__(self):
+        self.sums = dict()  # (Category, Year) -> Amount by Month
+        self.counts = dict()  # (Category, Year) -> Transactions by Month
+
+    @classmethod
+    def totals(cls, df):
+        totals = df.groupby(cls.columns[:3]).Amount.agg(["sum", "size"])
+        totals.columns = cls.totals_columns[3:]
+        return totals.reset_index()
+
+    def add(self, df, sign=1):
+        # Only the Given Rows are Grouped
+        if len(df):
+            self.add_totals(self.totals(df), sign)
+
+    def add_totals(self, totals, sign=1):
+        for category, year, month, value, count in zip(totals.Category, totals.Year, totals.Month,
+                                                       totals.Amount, totals.Count):
+            key = (category, int(year))
+            if key not in self.sums:
+                self.sums[key] = np.zeros(12)
+                self.counts[key] = np.zeros(12, dtype=int)
+            month = int(month) - 1
+            self.counts[key][month] += sign * count
+            if self.counts[key][month] == 0:
+                self.sums[key][month] = 0.0  # No Rounding Residue for Emptied Cells
+            else:
+                self.sums[key][month] += sign * value
+
+    def get_months(self):
+        months = np.zeros(12, dtype=int)
+        for counts in self.counts.values():
+            months += counts
+        return (np.flatnonzero(months) + 1).tolist()
+
+    def get_table(self, years):
+        # Category x Month Sums (Size Depends on Categories and Years Only)
+        sums = dict()
+        for (category, year), months in self.sums.items():
+            if year in years:
+                sums[category] = sums.get(category, 0) + months
+        table = pd.DataFrame(sums, index=range(1, 13), dtype=float).T
+        table.index.name = "Category"
+        return table
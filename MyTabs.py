@@ -6,8 +6,9 @@ from PyQt5.QtWidgets import QGridLayout, QVBoxLayout, QHBoxLayout
 from MyHelperClasses import Colors
 from MyWidgets import BudgetTable, RulesTable, ImportsTable, LedgerTable, DuplicatesTable
 from MyButtons import MoveUpButton, MoveDownButton, DeleteButton, AddRowButton, PrintButton
-from MyButtons import YearComboBox, ImportTransactionsButton, AutoCategorizeButton
-from MyButtons import AcceptCategorizedButton, ClearImportsButton, ClearDuplicatesButton
+from MyButtons import YearComboBox, ImportTransactionsButton, ImportFilesButton, AutoCategorizeButton
+from MyButtons import AcceptCategorizedButton, ClearImportsButton, ClearDuplicatesButton, NearDuplicatesButton
+from MyButtons import ParallelCheckBox
 
 
 plt.ioff()
@@ -113,13 +114,17 @@ class ImportsTab(QWidget):
         self.table = FiveButtonTable(ImportsTable, model)
         # Buttons
         self.import_btn = ImportTransactionsButton(self)
+        self.import_files_btn = ImportFilesButton(self)
         self.autocat_btn = AutoCategorizeButton(self)
+        self.parallel_box = ParallelCheckBox(self)
         self.accept_btn = AcceptCategorizedButton(self)
         self.clear_btn = ClearImportsButton(self)
         # Layout
         self.layout = QVBoxLayout(self)
         self.layout.addWidget(self.import_btn)
+        self.layout.addWidget(self.import_files_btn)
         self.layout.addWidget(self.autocat_btn)
+        self.layout.addWidget(self.parallel_box)
         self.layout.addWidget(self.accept_btn)
         self.layout.addWidget(self.clear_btn)
         self.layout.addWidget(self.table)
@@ -132,6 +137,15 @@ class ImportsTab(QWidget):
         self.table.table.data.import_transactions(file_name)
         self.update_tab()
 
+    def import_files(self):
+        prompt = "Select Files to Open"
+        file_type = "CSV files (*.csv)"
+        directory = os.path.dirname(__file__)
+        file_names = QFileDialog.getOpenFileNames(self, prompt, directory, file_type)[0]
+        if file_names:
+            self.table.table.data.import_files(file_names)
+            self.update_tab()
+
     def auto_categorize(self):
         self.table.table.data.auto_categorize()
         self.update_tab()
@@ -183,15 +197,21 @@ class DuplicatesTab(QWidget):
         self.table = FiveButtonTable(DuplicatesTable, model)
         # Buttons
         self.clear_button = ClearDuplicatesButton(self)
+        self.near_button = NearDuplicatesButton(self)
         # Layout
         self.layout = QVBoxLayout(self)
         self.layout.addWidget(self.clear_button)
+        self.layout.addWidget(self.near_button)
         self.layout.addWidget(self.table)
         
     def clear_duplicates(self):
         self.table.table.data.__init__(self.model)
         self.update_tab()
 
+    def find_near_duplicates(self):
+        self.model.ledger.move_near_duplicates()
+        self.update_tab()
+
     def update_tab(self):
         print("Updating Duplicates Tab")
         self.table.table.update_table()
\ No newline at end of file
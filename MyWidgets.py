@@ -1,115 +1,155 @@
 import numpy as np
 from MyButtons import AddRuleButton
-from PyQt5.QtCore import Qt
+from MyMatchers import KeywordMatcher
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
 from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem
+from PyQt5.QtWidgets import QTableView
 
 
-class PandasTable(QTableWidget):
+class PandasModel(QAbstractTableModel):
+    def __init__(self, table):
+        super().__init__()
+        self.table = table
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.table.data.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.table.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        # Only Called for Visible Cells
+        row, col = index.row(), index.column()
+        if self.table.columns[col] in self.table.buttons:
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.table.cell_text(row, col)
+        elif role == Qt.ForegroundRole:
+            return self.table.cell_color(row, col)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.table.columns[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        column = self.table.columns[index.column()]
+        if column in self.table.data.disabled or column in self.table.buttons:
+            return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole:
+            return False
+        self.table.update_dataframe(index.row(), index.column(), str(value))
+        return True
+
+
+class PandasTable(QTableView):
     def __init__(self, model, data, buttons=None):
         if buttons is None:
             buttons = dict()
         super().__init__()
         self.model = model
-        self.data = data
-        self.old_df = data.df.copy()
+        self._data = data
+        self.row_count = 0
         self.buttons = buttons
         self.columns = self.data.df.columns.tolist() + list(self.buttons.keys())
-        self.setColumnCount(len(self.columns))
-        self.setHorizontalHeaderLabels(self.columns)
+        self.table_model = PandasModel(self)
+        self.setModel(self.table_model)
+        self.delegates = dict()
+        for col, column in enumerate(self.columns):
+            if column in self.buttons:
+                self.delegates[column] = self.buttons[column](self)
+                self.setItemDelegateForColumn(col, self.delegates[column])
         for col, width in enumerate(self.column_widths):
             self.setColumnWidth(col, width)
-        self.connect()
         self.fill_all()
 
-    def connect(self):
-        self.cellChanged.connect(self.update_dataframe)
-        
-    def disconnect(self):
-        self.cellChanged.disconnect(self.update_dataframe)
- 
-    def update_dataframe(self, row, col):
-        text = self.item(row, col).text()
-        value = self.data.set_value(row, col, text)
-        self.item(row, col).setText(value)
-        self.update_table()
+    @property
+    def data(self):
+        return self._data
 
-    def update_record(self):
-        self.old_df = self.data.df.copy()
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self.fill_all()
+
+    def update_dataframe(self, row, col, text):
+        self.data.set_value(row, col, text)
+        self.update_table()
 
     def update_table(self):
-        if len(self.data.df) != len(self.old_df):
+        # Refresh Only the Cells the Data Marked as Written
+        reset, blocks = self.data.changes.pop()
+        if len(self.data.store) != self.row_count:
             print("Re-filling entire table!")
             self.fill_all()
+        elif reset and self.row_count:
+            self.fill_block(0, self.row_count - 1, 0, len(self.columns) - 1)
         else:
-            self.fill_changed()
+            for rows, columns in blocks:
+                self.fill_changed(rows, columns)
 
     def fill_all(self):
-        self.disconnect()
-        self.setRowCount(len(self.data.df))
-        for col, column in enumerate(self.columns):
-            if column in self.buttons:
-                for row in range(self.rowCount()):
-                    button = self.buttons[column](self)
-                    self.setCellWidget(row, col, button)
-            else:
-                if column in self.data.disabled:
-                    flag = Qt.ItemIsSelectable | Qt.ItemIsEnabled
-                else:
-                    flag = None
-                data = self.data.df.iloc[:, col].apply(str).tolist()
-                for row in range(self.rowCount()):
-                    text = data[row]
-                    item = QTableWidgetItem(text)
-                    if flag:
-                        item.setFlags(flag)
-                    self.format_cell(row, col, item)
-                    self.setItem(row, col, item)
-        self.connect()
-        self.update_record()
-
-    def fill_changed(self):
-        rows, cols = np.where(self.data.df != self.old_df)
-        self.fill_indexes(rows, cols)
-
-    def fill_row(self, row):
-        rows = [row] * self.columnCount()
-        cols = range(self.columnCount())
-        self.fill_indexes(rows, cols)
-
-    def fill_indexes(self, rows, cols):
-        self.disconnect()
-        for row, col in zip(rows, cols):
-            self.fill_item(row, col)
-        self.connect()
-        self.update_record()
-
-    def fill_item(self, row, col):
-        column = self.columns[col]
-        if column in self.data.disabled:
-            flag = Qt.ItemIsSelectable | Qt.ItemIsEnabled
-        else:
-            flag = False
-        if column not in self.buttons:
-            text = str(self.data.df.iloc[row, col])
-            item = QTableWidgetItem(text)
-            if flag:
-                item.setFlags(flag)
-            self.format_cell(row, col, item)
-            self.setItem(row, col, item)
+        self.table_model.beginResetModel()
+        self.data.changes.pop()
+        self.row_count = len(self.data.store)
+        self.table_model.endResetModel()
+
+    def fill_changed(self, rows, columns, max_spans=64):
+        rows = np.unique(self.data.df.index.get_indexer(np.asarray(rows).ravel()))
+        cols = [self.columns.index(column) for column in columns]
+        rows = rows[rows >= 0]  # Labels No Longer in the Frame
+        if len(rows) == 0:
+            return
+        left, right = min(cols), max(cols)
+        # One Signal per Run of Adjacent Rows, or One Box if There are Many Runs
+        breaks = np.flatnonzero(np.diff(rows) > 1)
+        if len(breaks) >= max_spans:
+            self.fill_block(rows[0], rows[-1], left, right)
+            return
+        starts = np.concatenate(([rows[0]], rows[breaks + 1]))
+        stops = np.concatenate((rows[breaks], [rows[-1]]))
+        for start, stop in zip(starts, stops):
+            self.fill_block(start, stop, left, right)
+
+    def fill_block(self, top, bottom, left, right):
+        # Views Re-Read Cells Only if They are Visible
+        first = self.table_model.index(int(top), int(left))
+        last = self.table_model.index(int(bottom), int(right))
+        self.table_model.dataChanged.emit(first, last)
+
+    def rowCount(self):
+        return self.table_model.rowCount()
+
+    def currentRow(self):
+        return self.currentIndex().row()
         
     def add_row(self):
-        self.data.insert_blank_row()
         row = self.rowCount()
-        self.insertRow(row)
-        self.fill_row(row)
+        self.table_model.beginInsertRows(QModelIndex(), row, row)
+        self.data.insert_blank_row()
+        self.data.changes.pop()
+        self.row_count = len(self.data.store)
+        self.table_model.endInsertRows()
         self.selectRow(row)
         
     def delete_row(self):
         row = self.currentRow()
         if self.is_valid_row(row):
+            self.table_model.beginRemoveRows(QModelIndex(), row, row)
             self.data.delete_row(row)
-            self.removeRow(row)
+            self.data.changes.pop()
+            self.row_count = len(self.data.store)
+            self.table_model.endRemoveRows()
         else:
             print(f"Cannot delete row {row}")
             
@@ -118,45 +158,68 @@ class PandasTable(QTableWidget):
         row2 = row1 + offset
         if self.is_valid_row(row1) and self.is_valid_row(row2):
             self.data.swap_rows(row1, row2)
-            self.fill_row(row1)
-            self.fill_row(row2)
+            self.update_table()
             self.selectRow(row2)
             
     def is_valid_row(self, row):
         return 0 <= row < self.rowCount()
 
-    def format_cell(self, row, col, item):
-        pass
+    def cell_text(self, row, col):
+        return str(self.data.store.get_value(row, col))  # No Compaction for a Repaint
+
+    def cell_color(self, row, col):
+        return None
 
 
 class BudgetTable(PandasTable):
+    colors = None  # Shared QColor per Level
+
     def __init__(self, model):
         self.column_widths = [30, 150, *[60] * 16, 50]
+        self.cells = None
+        self.cells_version = None
         super().__init__(model, model.budget)
         self.setFixedWidth(1200)
-        
-    def format_cell(self, row, col, item):
-        if col in range(3, 17):
-            sign = self.data.df.Sign[row]
-            value = self.data.df.iloc[row, col]
-            if col == 4:
-                budget = 0
-            else:
-                budget = self.data.df.Budget[row]
-            color = self.color(value, budget, sign)
-            item.setForeground(color)
+
+    def cell_text(self, row, col):
+        return self.get_cells()[0][row, col]
+
+    def cell_color(self, row, col):
+        return self.get_cells()[1][row, col]
+
+    def get_cells(self):
+        # Text and Colors for the Whole Table, Rebuilt Only When the Budget Changes
+        if self.cells_version != self.data.changes.version:
+            self.cells = self.format_cells(self.data.df)
+            self.cells_version = self.data.changes.version
+        return self.cells
+
+    @classmethod
+    def format_cells(cls, df, first=3, last=17):
+        text = df.astype(str).to_numpy()
+        sign = df.Sign.to_numpy(dtype=float)[:, None]
+        budget = np.repeat(df.Budget.to_numpy(dtype=float)[:, None], last - first, axis=1)
+        budget[:, 4 - first] = 0  # Net is Compared to Zero
+        values = df.iloc[:, first:last].to_numpy(dtype=float)
+        levels = cls.color_levels(values, budget, sign)
+        palette = cls.palette()
+        colors = np.full(df.shape, None, dtype=object)
+        colors[:, first:last] = palette[levels + 255]
+        return text, colors
 
     @staticmethod
-    def color(value, budget, sign, scale=50):
-        rgb = sign * (value - budget) / scale
-        if rgb > 1:
-            rgb = 1
-        elif rgb < -1:
-            rgb = -1
-        if  rgb >= 0:
-            return QColor.fromRgb(0, int(255 * rgb), 0)
-        else:
-            return QColor.fromRgb(int(-255 * rgb), 0, 0)
+    def color_levels(value, budget, sign, scale=50):
+        # Red (Negative) to Green (Positive), -255..255
+        rgb = np.clip(sign * (value - budget) / scale, -1, 1)
+        return np.trunc(255 * rgb).astype(int)
+
+    @classmethod
+    def palette(cls):
+        if cls.colors is None:
+            colors = [QColor.fromRgb(-level, 0, 0) for level in range(-255, 0)]
+            colors += [QColor.fromRgb(0, level, 0) for level in range(256)]
+            cls.colors = np.fromiter(colors, dtype=object, count=len(colors))
+        return cls.colors
 
 
 class RulesTable(PandasTable):
@@ -180,13 +243,17 @@ class LedgerTable(PandasTable):
         subcategory = self.data.df.loc[row, "Sub Category"]
         if keyword == "None":  # If keyword is blank, use Memo
             keyword = self.data.df.loc[row, "Memo"]
-        if keyword in self.model.rules.df.Keyword.values:
+        if keyword in self.model.rules.keyword_index:
             print(f"Rule {keyword} already exists.")
+        elif not KeywordMatcher.is_pattern(keyword):
+            print(f"Rule {keyword} is not a valid pattern.")
         elif category not in self.model.budget.df.Category.values:
             print(f"Budget {category} is not defined.")
         else:
-            self.data.df.loc[row, "Keyword"] = keyword
-            self.fill_row(row)
+            self.data.unindex_rows([row])
+            self.data.set_cells([row], "Keyword", keyword)
+            self.data.index_rows([row])
+            self.update_table()
             self.model.rules.add_rule(keyword, category, subcategory)
 
 